@@ -0,0 +1,59 @@
+"""Helpers shared by the benchmarks that report comparable JSON results.
+
+Importing this module has no side effects: it does not touch
+DATABASE_URL or import the app.
+"""
+import asyncio
+import json
+import subprocess
+
+
+class Lifespan:
+    """startup/shutdown للـ app من غير server، زي اللي uvicorn بيعمله."""
+
+    def __init__(self, app):
+        self.app = app
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.task = None
+
+    async def __aenter__(self):
+        self.task = asyncio.create_task(self.app({"type": "lifespan"}, self.incoming.get, self.outgoing.put))
+        await self.incoming.put({"type": "lifespan.startup"})
+        await self._expect("lifespan.startup.complete")
+
+    async def __aexit__(self, *exc):
+        await self.incoming.put({"type": "lifespan.shutdown"})
+        await self._expect("lifespan.shutdown.complete")
+        await self.task
+
+    async def _expect(self, message_type: str):
+        message = await self.outgoing.get()
+        if message["type"] != message_type:
+            raise RuntimeError(f"lifespan failed: {message}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def add_result_args(parser, threshold_help: str):
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help=threshold_help)
+
+
+def save_and_compare(results, args, compare):
+    # compare(results, baseline, threshold) بيطبع الفرق ويرجع أسماء اللي حصلها regression
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            raise SystemExit(f"regressions in: {', '.join(regressions)}")
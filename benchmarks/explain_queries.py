@@ -0,0 +1,185 @@
+"""Check with EXPLAIN that the hot filters are served by their indexes.
+
+Run from the repo root:  python -m benchmarks.explain_queries
+
+Uses DATABASE_URL when it is set (SQLite or Postgres), otherwise a
+temporary SQLite file. When there are no posts, a couple of months of
+synthetic activity is seeded and analyzed so the planner sees realistic
+statistics. Seeding and EXPLAIN share one transaction that is always
+rolled back, so the database is left exactly as it was.
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/explain_queries.db")
+
+from sqlalchemy import delete, func, insert, select, update
+
+import crud
+from bootstrap import create_schema
+from database import get_engine
+from models import Comment, Like, Message, Notification, Post, User
+
+engine = get_engine()
+
+USERS = 50
+DAYS = 60
+
+
+def seed(conn):
+    """بيرجع user الـ checks: صاحب آخر بوست، أو أول user في الـ seed."""
+    latest_author = conn.execute(select(Post.user_id).order_by(Post.id.desc()).limit(1)).scalar()
+    if latest_author is not None:
+        return latest_author
+    now = datetime.utcnow()
+    # الـ ids بعد آخر id موجود، عشان الـ users الحقيقيين ميتعارضوش مع الـ seed
+    first_user = (conn.execute(select(func.max(User.id))).scalar() or 0) + 1
+    first_post = (conn.execute(select(func.max(Post.id))).scalar() or 0) + 1
+    conn.execute(insert(User), [{"id": first_user + i, "username": f"explain{i}", "password": "x"} for i in range(USERS)])
+    posts = []
+    for day in range(DAYS):
+        for user_id in range(first_user, first_user + 20):
+            posts.append({"id": first_post + len(posts), "user_id": user_id, "content": "post",
+                          "timestamp": now - timedelta(days=day, minutes=user_id)})
+    conn.execute(insert(Post), posts)
+    conn.execute(insert(Comment), [
+        {"post_id": post["id"], "user_id": first_user + (post["id"] + i) % USERS, "content": "comment",
+         "timestamp": post["timestamp"]}
+        for post in posts for i in range(3)
+    ])
+    conn.execute(insert(Like), [
+        {"post_id": post["id"], "user_id": first_user + (post["id"] + i) % USERS}
+        for post in posts for i in range(post["id"] % 5)
+    ])
+    conn.execute(insert(Notification), [
+        {"user_id": post["user_id"], "message": "like", "post_id": post["id"], "kind": "like",
+         "timestamp": post["timestamp"], "is_read": post["id"] % 2}
+        for post in posts for _ in range(2)
+    ])
+    conn.execute(insert(Message), [
+        {"sender": f"explain{i % USERS}", "receiver": f"explain{(i * 7) % USERS}", "content": "hi",
+         "timestamp": now - timedelta(minutes=i)}
+        for i in range(len(posts) * 2)
+    ])
+    conn.exec_driver_sql("ANALYZE")
+    return first_user
+
+
+def checks(user_id: int, notification_id: int):
+    day_start, day_end = crud._day_bounds()
+    return [
+        (
+            "user's posts today",
+            select(Post.id).where(Post.user_id == user_id, Post.timestamp >= day_start, Post.timestamp < day_end)
+            .limit(1),
+            {"ix_posts_user_id_timestamp"},
+        ),
+        (
+            "server posts today (quota reconcile)",
+            select(func.count(Post.id)).where(Post.timestamp >= day_start, Post.timestamp < day_end),
+            {"ix_posts_timestamp"},
+        ),
+        (
+            "old posts cleanup range",
+            select(func.min(Post.id), func.max(Post.id)).where(Post.timestamp < day_start),
+            # Postgres بيمشي الـ primary key من الطرفين لحد أول بوست قديم
+            {"ix_posts_timestamp", "posts_pkey", "ix_posts_id"},
+        ),
+        (
+            "old posts cleanup batch",
+            delete(Post).where(Post.id >= 1, Post.id <= 500, Post.timestamp < day_start),
+            {"posts_pkey", "ix_posts_id", "INTEGER PRIMARY KEY"},
+        ),
+        (
+            "feed comments",
+            select(Comment.id).where(Comment.post_id.in_([1, 2, 3])).order_by(Comment.timestamp.asc()),
+            {"ix_comments_post_id_timestamp"},
+        ),
+        (
+            "liked by current user",
+            select(Like.post_id).where(Like.user_id == user_id, Like.post_id.in_([1, 2, 3])),
+            {"ix_likes_user_id_post_id"},
+        ),
+        (
+            "conversation page",
+            crud._conversation_query("explain1", "explain7", limit=51),
+            {"ix_messages_conversation"},
+        ),
+        (
+            "notifications page",
+            select(Notification.id).where(Notification.user_id == user_id, Notification.id < notification_id)
+            .order_by(Notification.id.desc()).limit(51),
+            {"ix_notifications_user_id_id"},
+        ),
+        (
+            "unread notification merge",
+            crud._unread_notifications_query([1, 2, 3], ["like", "comment"]),
+            {"ix_notifications_post_id_kind"},
+        ),
+        (
+            "unread notifications count",
+            select(func.count()).select_from(Notification)
+            .where(Notification.user_id == user_id, Notification.is_read == 0),
+            {"ix_notifications_user_id_is_read_timestamp"},
+        ),
+        (
+            "mark notifications read",
+            update(Notification)
+            .where(Notification.user_id == user_id, Notification.is_read == 0, Notification.id <= notification_id)
+            .values(is_read=1),
+            {"ix_notifications_user_id_is_read_timestamp", "ix_notifications_user_id_id"},
+        ),
+        (
+            "read notifications retention",
+            select(Notification.id).where(Notification.timestamp < day_start - timedelta(days=30), Notification.is_read == 1)
+            .limit(1000),
+            # SQLite بيعمل skip-scan على الـ composite بعد ANALYZE، والاتنين كويسين
+            {"ix_notifications_timestamp", "ix_notifications_user_id_is_read_timestamp"},
+        ),
+    ]
+
+
+def explain(conn, statement):
+    compiled = statement.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    rows = conn.exec_driver_sql(prefix + str(compiled), params).all()
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def main():
+    create_schema(engine)
+
+    failures = []
+    with engine.connect() as conn:
+        # الـ seed والـ ANALYZE والـ SET كلهم بيترجعوا مع الـ rollback
+        transaction = conn.begin()
+        try:
+            user_id = seed(conn)
+            # الـ sequence مبيرجعش مع الـ rollback، فالـ cursor من الداتا مش رقم ثابت
+            lowest, highest = conn.execute(select(func.min(Notification.id), func.max(Notification.id))).one()
+            notification_id = ((lowest or 0) + (highest or 0)) // 2
+            if engine.dialect.name == "postgresql":
+                conn.exec_driver_sql("SET enable_seqscan = off")
+            for name, statement, expected in checks(user_id, notification_id):
+                plan = explain(conn, statement)
+                lines = plan.splitlines() or [""]
+                matching = [line.strip() for line in lines if any(index in line for index in expected)]
+                print(f"{'OK  ' if matching else 'FAIL'} {name}: {(matching or lines)[0].strip()}")
+                if not matching:
+                    failures.append((name, plan))
+        finally:
+            transaction.rollback()
+
+    if failures:
+        for name, plan in failures:
+            print(f"\n{name}:\n{plan}")
+        raise SystemExit(f"{len(failures)} queries do not use their index")
+    print("OK: all checked queries use an index")
+
+
+if __name__ == "__main__":
+    main()
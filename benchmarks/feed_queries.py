@@ -0,0 +1,106 @@
+"""Count the SQL statements issued by one GET /posts feed build.
+
+Run from the repo root:  python -m benchmarks.feed_queries
+
+Seeds a scratch database at growing sizes and fails if the number of
+queries per feed request changes with the number of posts, both with a
+cold feed cache and with every post already cached.
+
+Every table is dropped between sizes, so DATABASE_URL is never used: the
+database is BENCH_DATABASE_URL when set, otherwise a temporary SQLite
+file (see benchmarks/scratch.py).
+"""
+import asyncio
+import json
+import time
+
+from benchmarks.scratch import use_scratch_database
+
+use_scratch_database("feed_queries_bench")
+
+from sqlalchemy import event
+
+import crud
+from database import AsyncSessionLocal, Base, get_async_engine, get_engine
+from feed_cache import feed_cache
+from models import Comment, Like, Post, User
+
+engine = get_engine()
+async_engine = get_async_engine()
+
+SIZES = (10, 100, 500)
+USERS = 50
+COMMENTS_PER_POST = 3
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+async def seed(db, posts: int):
+    users = [User(username=f"user{i}", password="x") for i in range(USERS)]
+    db.add_all(users)
+    await db.flush()
+    for i in range(posts):
+        author = users[i % USERS]
+        post = Post(user_id=author.id, content=f"post {i}")
+        db.add(post)
+        await db.flush()
+        for j in range(COMMENTS_PER_POST):
+            db.add(Comment(post_id=post.id, user_id=users[(i + j + 1) % USERS].id, content="comment"))
+        for j in range(i % 5):
+            db.add(Like(post_id=post.id, user_id=users[(i + j) % USERS].id))
+    await db.commit()
+    await crud.reconcile_post_counters(db)
+    return users[0].id
+
+
+async def measure(posts: int):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    async with AsyncSessionLocal() as db:
+        current_user_id = await seed(db, posts)
+
+    async with AsyncSessionLocal() as db:
+        feed_cache.clear()
+        cold = await build_feed(db, current_user_id, posts)
+        warm = await build_feed(db, current_user_id, posts)
+    return cold, warm
+
+
+async def build_feed(db, current_user_id: int, posts: int):
+    counter = QueryCounter()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+    started = time.perf_counter()
+    try:
+        body = await crud.get_feed_json(db, current_user_id)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", counter)
+    elapsed = time.perf_counter() - started
+
+    assert len(json.loads(body)) == posts
+    return counter.count, elapsed
+
+
+async def main():
+    counts = {}
+    for size in SIZES:
+        (cold_queries, cold_elapsed), (warm_queries, warm_elapsed) = await measure(size)
+        counts[size] = (cold_queries, warm_queries)
+        print(
+            f"posts={size:<5} cold: queries={cold_queries:<3} time={cold_elapsed * 1000:.1f}ms  "
+            f"warm: queries={warm_queries:<3} time={warm_elapsed * 1000:.1f}ms"
+        )
+    await async_engine.dispose()
+
+    if len(set(counts.values())) != 1:
+        raise SystemExit(f"query count grows with feed size: {counts}")
+    print("OK: query count is constant")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,300 @@
+"""Replay a mixed API workload against the app in-process and report latency.
+
+Run from the repo root:
+
+    python -m benchmarks.load [--users 200] [--posts 2000] [--requests 5000]
+                              [--concurrency 20] [--ws-clients 200]
+                              [--mix feed=40,like=20,...] [--output run.json]
+                              [--compare baseline.json]
+
+Seeds users, posts, comments and likes, then sends a weighted random mix
+of feed reads, likes/unlikes, comments, logins, conversation and
+notification reads through httpx's ASGI transport (no network), while
+fake WebSocket clients stay subscribed to /ws/posts. Reports p50/p99
+latency, throughput and SQL statements per request for every operation.
+
+Every table is dropped and re-seeded, so DATABASE_URL is never used: the
+database is BENCH_DATABASE_URL when set (point it at a scratch Postgres
+database to benchmark Postgres), otherwise a temporary SQLite file; see
+benchmarks/scratch.py. Needs httpx.
+
+--output writes the results as JSON (with the git commit) and --compare
+prints the difference against an earlier run and fails when p99 latency
+or queries per request regress beyond --threshold.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import Lifespan, add_result_args, git_commit, save_and_compare
+from benchmarks.scratch import use_scratch_database
+
+use_scratch_database("load_bench")
+# تسجيل الدخول بيقيس الـ endpoint مش bcrypt، فبنقلل الـ rounds إلا لو اتحددت
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("SESSION_SECRET", "load-bench-secret")
+
+import httpx
+from sqlalchemy import insert
+
+import passwords
+from database import Base, get_async_engine, get_engine
+from instrumentation import metrics
+from models import Comment, Like, Post, User
+
+import main
+
+engine = get_engine()
+
+DEFAULT_MIX = {
+    "feed": 40,
+    "like": 20,
+    "comment": 8,
+    "comments": 10,
+    "login": 4,
+    "messages": 8,
+    "notifications": 10,
+}
+# الـ routes اللي كل عملية بتضربها، عشان نجيب عدد الـ queries من instrumentation
+ROUTES = {
+    "feed": [("GET", "/posts")],
+    "like": [("POST", "/likes"), ("DELETE", "/likes")],
+    "comment": [("POST", "/comments")],
+    "comments": [("GET", "/comments/{post_id}")],
+    "login": [("POST", "/login")],
+    "messages": [("POST", "/messages"), ("GET", "/messages")],
+    "notifications": [("GET", "/notifications/{user_id}")],
+}
+PASSWORD = "bench-password"
+
+
+def seed(users: int, posts: int, comments_per_post: int, likes_per_post: int, rng: random.Random):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    hashed = passwords.bcrypt.hashpw(PASSWORD.encode(), passwords.bcrypt.gensalt(passwords.BCRYPT_ROUNDS)).decode()
+    now = datetime.utcnow()
+    day_start = datetime.combine(now.date(), datetime.min.time())
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": i, "username": f"bench{i}", "password": hashed} for i in range(1, users + 1)])
+        post_rows, comment_rows, like_rows = [], [], []
+        for post_id in range(1, posts + 1):
+            likers = rng.sample(range(1, users + 1), min(rng.randint(0, likes_per_post * 2), users))
+            # كل البوستات من النهارده عشان الـ cleanup job ميمسحهاش أثناء القياس
+            timestamp = max(day_start, now - timedelta(seconds=posts - post_id))
+            post_rows.append({"id": post_id, "user_id": rng.randint(1, users), "content": f"post {post_id}",
+                              "timestamp": timestamp, "likes_count": len(likers), "comments_count": comments_per_post})
+            comment_rows += [{"post_id": post_id, "user_id": rng.randint(1, users), "content": "comment",
+                              "timestamp": timestamp} for _ in range(comments_per_post)]
+            like_rows += [{"post_id": post_id, "user_id": user_id} for user_id in likers]
+        conn.execute(insert(Post), post_rows)
+        if comment_rows:
+            conn.execute(insert(Comment), comment_rows)
+        if like_rows:
+            conn.execute(insert(Like), like_rows)
+    engine.dispose()
+
+
+class FakeWebSocket:
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        self.stats["ws_messages"] += 1
+
+    async def close(self, code: int = 1000):
+        self.stats["ws_closed"] += 1
+
+
+class Workload:
+    def __init__(self, client: httpx.AsyncClient, users: int, posts: int, rng: random.Random):
+        self.client = client
+        self.users = users
+        self.posts = posts
+        self.rng = rng
+
+    def user(self):
+        return self.rng.randint(1, self.users)
+
+    def post(self):
+        # التفاعل متركز على البوستات الجديدة زي الاستخدام الحقيقي
+        return max(1, self.posts - int(self.rng.expovariate(1 / max(self.posts / 10, 1))))
+
+    async def feed(self):
+        return await self.client.get("/posts", params={"current_user_id": self.user(), "limit": 20})
+
+    async def like(self):
+        params = {"user_id": self.user(), "post_id": self.post()}
+        if self.rng.random() < 0.3:
+            return await self.client.delete("/likes", params=params)
+        return await self.client.post("/likes", json=params)
+
+    async def comment(self):
+        return await self.client.post("/comments", json={"user_id": self.user(), "post_id": self.post(), "content": "bench"})
+
+    async def comments(self):
+        return await self.client.get(f"/comments/{self.post()}")
+
+    async def login(self):
+        return await self.client.post("/login", json={"username": f"bench{self.user()}", "password": PASSWORD})
+
+    async def messages(self):
+        user, peer = self.user(), self.user()
+        if self.rng.random() < 0.5:
+            return await self.client.post("/messages", json={"sender": f"bench{user}", "receiver": f"bench{peer}", "content": "hi"})
+        return await self.client.get("/messages", params={"user": f"bench{user}", "peer": f"bench{peer}", "limit": 50})
+
+    async def notifications(self):
+        return await self.client.get(f"/notifications/{self.user()}", params={"limit": 20})
+
+
+def percentile(values, q: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    seed(args.users, args.posts, args.comments_per_post, args.likes_per_post, rng)
+
+    mix = dict(DEFAULT_MIX)
+    if args.mix:
+        mix = {name: float(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+    unknown = set(mix) - set(ROUTES)
+    if unknown:
+        raise SystemExit(f"unknown operations in --mix: {', '.join(sorted(unknown))}")
+    names = list(mix)
+    plan = rng.choices(names, weights=[mix[name] for name in names], k=args.requests)
+
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    ws_stats = {"ws_messages": 0, "ws_closed": 0}
+    transport = httpx.ASGITransport(app=main.app)
+
+    async with Lifespan(main.app):
+        sockets = [FakeWebSocket(ws_stats) for _ in range(args.ws_clients)]
+        for socket in sockets:
+            await main.post_manager.connect(socket)
+        metrics.routes.clear()
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            workload = Workload(client, args.users, args.posts, rng)
+            queue = iter(plan)
+
+            async def worker():
+                for name in queue:
+                    started = time.perf_counter()
+                    response = await getattr(workload, name)()
+                    latencies[name].append(time.perf_counter() - started)
+                    if response.status_code >= 400:
+                        errors[name] += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+            # نستنى الـ writer tasks تفضّي الـ queues قبل ما نقفل
+            await asyncio.sleep(0.1)
+
+        for socket in sockets:
+            main.post_manager.disconnect(socket)
+        route_stats = dict(metrics.routes)
+    await get_async_engine().dispose()
+
+    operations = {}
+    for name in names:
+        values = latencies[name]
+        hit = [route_stats[route] for route in ROUTES[name] if route in route_stats]
+        queries = sum(stats.queries for stats in hit)
+        requests = sum(stats.count for stats in hit)
+        operations[name] = {
+            "requests": len(values),
+            "errors": errors[name],
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "mean_ms": statistics.fmean(values) * 1000 if values else 0.0,
+            "queries_per_request": queries / requests if requests else 0.0,
+        }
+
+    return {
+        "commit": git_commit(),
+        "dialect": engine.dialect.name,
+        "created_at": datetime.utcnow().isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "mix": mix,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": args.requests / elapsed,
+        "websocket": {"clients": args.ws_clients, **ws_stats},
+        "operations": operations,
+    }
+
+
+def report(results):
+    print(f"commit={results['commit']} db={results['dialect']} "
+          f"requests={results['config']['requests']} concurrency={results['config']['concurrency']}")
+    print(f"{'operation':<14}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}{'mean ms':>9}{'queries':>9}")
+    for name, op in results["operations"].items():
+        print(f"{name:<14}{op['requests']:>9}{op['errors']:>8}{op['p50_ms']:>9.2f}{op['p99_ms']:>9.2f}"
+              f"{op['mean_ms']:>9.2f}{op['queries_per_request']:>9.2f}")
+    ws = results["websocket"]
+    print(f"throughput={results['throughput_rps']:.0f} req/s  elapsed={results['elapsed_seconds']:.2f}s  "
+          f"ws clients={ws['clients']} messages={ws['ws_messages']} dropped={ws['ws_closed']}")
+
+
+def compare(results, baseline, threshold: float):
+    print(f"\ncompared with {baseline.get('commit')} (threshold {threshold:.0%}):")
+    if baseline.get("config") != results["config"] or baseline.get("dialect") != results["dialect"]:
+        print("  warning: runs used different settings, numbers are not directly comparable")
+    regressions = []
+    for name, op in results["operations"].items():
+        before = baseline["operations"].get(name)
+        if before is None:
+            continue
+        p99_change = (op["p99_ms"] - before["p99_ms"]) / before["p99_ms"] if before["p99_ms"] else 0.0
+        queries_change = op["queries_per_request"] - before["queries_per_request"]
+        flags = []
+        if p99_change > threshold:
+            flags.append("p99")
+        # عدد الـ queries لازم يفضل ثابت، أي زيادة (غير الفروق العشوائية الصغيرة) regression
+        if queries_change > 0.5:
+            flags.append("queries")
+        print(f"  {name:<14} p99 {before['p99_ms']:>8.2f} -> {op['p99_ms']:>8.2f} ms ({p99_change:+.0%})  "
+              f"queries {before['queries_per_request']:.2f} -> {op['queries_per_request']:.2f}"
+              f"{'  REGRESSION: ' + ', '.join(flags) if flags else ''}")
+        if flags:
+            regressions.append(name)
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--comments-per-post", type=int, default=3)
+    parser.add_argument("--likes-per-post", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--ws-clients", type=int, default=200)
+    parser.add_argument("--mix", help="comma separated name=weight, e.g. feed=50,like=50")
+    parser.add_argument("--seed", type=int, default=1)
+    add_result_args(parser, "allowed p99 slowdown (0.25 = 25%%)")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    results = asyncio.run(run(args))
+    report(results)
+    save_and_compare(results, args, compare)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,27 @@
+"""The database for benchmarks that drop and re-seed every table.
+
+They never run against DATABASE_URL: that names the app's own database,
+and under `railway run` it is production. BENCH_DATABASE_URL points them
+at a scratch database (e.g. a throwaway Postgres one); without it each
+benchmark gets its own SQLite file in the temp directory.
+"""
+import os
+import tempfile
+
+from sqlalchemy.engine import make_url
+
+
+def same_database(a: str, b: str):
+    # postgresql:// و postgresql+psycopg2:// نفس الـ database
+    a, b = make_url(a), make_url(b)
+    return a.set(drivername=a.get_backend_name()) == b.set(drivername=b.get_backend_name())
+
+
+def use_scratch_database(name: str):
+    url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.gettempdir()}/{name}.db"
+    app_url = os.getenv("DATABASE_URL")
+    if app_url and same_database(url, app_url):
+        raise SystemExit("BENCH_DATABASE_URL is the app's DATABASE_URL; this benchmark drops every table, "
+                         "point it at a scratch database")
+    os.environ["DATABASE_URL"] = url
+    return url
@@ -0,0 +1,151 @@
+"""Measure how long a fresh worker takes to boot and become ready.
+
+Run from the repo root:
+
+    python -m benchmarks.startup [--runs 5] [--output boot.json] [--compare baseline.json]
+
+Runs the schema bootstrap once (timed separately, as a deploy would), then
+starts --runs fresh Python processes. Each one times three phases:
+
+- import: `import main`
+- startup: the app's lifespan startup handlers
+- ready: the first 200 from /health/ready
+
+The parent also times the whole process, from spawn until ready, which
+includes interpreter start-up. Reports the median and max of every phase.
+
+The database named by DATABASE_URL is used as-is (no data is written
+apart from the schema); by default that is a throwaway SQLite file.
+Needs httpx.
+
+--output writes the results as JSON (with the git commit) and --compare
+fails when a median phase regresses beyond --threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.common import Lifespan, add_result_args, git_commit, save_and_compare
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/startup_bench.db")
+os.environ.setdefault("SESSION_SECRET", "startup-bench-secret")
+
+PHASES = ("import", "startup", "ready", "process")
+
+
+def child():
+    started = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+
+    import httpx
+
+    async def boot():
+        async with Lifespan(main.app):
+            booted = time.perf_counter()
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                response = await client.get("/health/ready")
+            ready = time.perf_counter()
+        return booted, ready, response.status_code
+
+    booted, ready, status = asyncio.run(boot())
+    # الـ import بيتقاس من الأول، والمراحل التانية متحسوبة من اللي قبلها
+    print(json.dumps({
+        "import": imported - started,
+        "startup": booted - imported,
+        "ready": ready - booted,
+        "status": status,
+    }))
+
+
+def run_child():
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--child"],
+                            capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - started
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["process"] = elapsed
+    return sample
+
+
+def run(args):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "bootstrap"], capture_output=True, check=True)
+    bootstrap_seconds = time.perf_counter() - started
+
+    samples = [run_child() for _ in range(args.runs)]
+    not_ready = sum(1 for sample in samples if sample["status"] != 200)
+    phases = {}
+    for phase in PHASES:
+        values = [sample[phase] for sample in samples]
+        phases[phase] = {"median_ms": statistics.median(values) * 1000, "max_ms": max(values) * 1000}
+
+    # هنا مش فوق، عشان الـ child نفسه ميعملش import لـ sqlalchemy قبل ما يبدأ يقيس
+    from sqlalchemy.engine import make_url
+
+    return {
+        "commit": git_commit(),
+        "dialect": make_url(os.environ["DATABASE_URL"]).get_backend_name(),
+        "created_at": datetime.utcnow().isoformat(),
+        "config": {"runs": args.runs},
+        "bootstrap_ms": bootstrap_seconds * 1000,
+        "not_ready": not_ready,
+        "phases": phases,
+    }
+
+
+def report(results):
+    print(f"commit={results['commit']} db={results['dialect']} runs={results['config']['runs']}")
+    print(f"bootstrap (once per deploy): {results['bootstrap_ms']:.0f} ms")
+    print(f"{'phase':<10}{'median ms':>11}{'max ms':>9}")
+    for phase, values in results["phases"].items():
+        print(f"{phase:<10}{values['median_ms']:>11.1f}{values['max_ms']:>9.1f}")
+    if results["not_ready"]:
+        print(f"warning: {results['not_ready']} runs were not ready after startup")
+
+
+def compare(results, baseline, threshold: float):
+    print(f"\ncompared with {baseline.get('commit')} (threshold {threshold:.0%}):")
+    if baseline.get("dialect") != results["dialect"]:
+        print("  warning: runs used different databases, numbers are not directly comparable")
+    regressions = []
+    for phase, values in results["phases"].items():
+        before = baseline["phases"].get(phase)
+        if before is None:
+            continue
+        change = (values["median_ms"] - before["median_ms"]) / before["median_ms"] if before["median_ms"] else 0.0
+        flag = change > threshold
+        print(f"  {phase:<10} {before['median_ms']:>8.1f} -> {values['median_ms']:>8.1f} ms ({change:+.0%})"
+              f"{'  REGRESSION' if flag else ''}")
+        if flag:
+            regressions.append(phase)
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    add_result_args(parser, "allowed median slowdown (0.25 = 25%%)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main_cli(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    if args.child:
+        return child()
+    results = run(args)
+    report(results)
+    save_and_compare(results, args, compare)
+
+
+if __name__ == "__main__":
+    main_cli()
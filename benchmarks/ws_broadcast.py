@@ -0,0 +1,90 @@
+"""Measure /ws/posts broadcast latency with thousands of connected clients.
+
+Run from the repo root:  python -m benchmarks.ws_broadcast [clients] [slow_clients]
+
+Connects in-process fake sockets to a ConnectionManager, a few of which
+stall on every send, and reports how long each broadcast takes to reach
+all healthy clients. Slow clients must not delay the others and must be
+dropped once their send queue fills up.
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from realtime import ConnectionManager
+
+BROADCASTS = 50
+
+
+class Delivery:
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.count = 0
+        self.done = asyncio.Event()
+
+    def reset(self):
+        self.count = 0
+        self.done.clear()
+
+    def mark(self):
+        self.count += 1
+        if self.count == self.expected:
+            self.done.set()
+
+
+class FakeWebSocket:
+    def __init__(self, delivery: Delivery = None, delay: float = 0.0):
+        self.delivery = delivery
+        self.delay = delay
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.delivery:
+            self.delivery.mark()
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+async def run(clients: int, slow_clients: int):
+    manager = ConnectionManager(queue_size=16, send_timeout=5)
+    delivery = Delivery(clients)
+    healthy = [FakeWebSocket(delivery) for _ in range(clients)]
+    slow = [FakeWebSocket(delay=10) for _ in range(slow_clients)]
+    for websocket in healthy + slow:
+        await manager.connect(websocket)
+
+    latencies = []
+    for i in range(BROADCASTS):
+        delivery.reset()
+        started = time.perf_counter()
+        await manager.broadcast({"action": "like", "post_id": i})
+        await delivery.done.wait()
+        latencies.append(time.perf_counter() - started)
+
+    await asyncio.sleep(0)
+    dropped = sum(1 for ws in slow if ws.closed_with is not None)
+    stats = manager.stats()
+    for websocket in list(manager.active_connections):
+        manager.disconnect(websocket)
+
+    latencies.sort()
+    print(f"clients={clients} slow={slow_clients} broadcasts={BROADCASTS}")
+    print(f"p50={statistics.median(latencies) * 1000:.2f}ms "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f}ms "
+          f"max={latencies[-1] * 1000:.2f}ms")
+    print(f"slow clients dropped={dropped}/{slow_clients} manager={stats}")
+    if dropped != slow_clients:
+        raise SystemExit("slow consumers were not disconnected")
+
+
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    slow_clients = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    asyncio.run(run(clients, slow_clients))
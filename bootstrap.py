@@ -0,0 +1,64 @@
+"""Create and upgrade the database schema once per deploy, before any worker starts:
+
+    python -m bootstrap
+
+Waits for the database to accept connections, then runs create_all and
+upgrade_schema. On Postgres an advisory lock keeps concurrent deploys
+from migrating at the same time.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from sqlalchemy import exc, text
+from database import Base, get_engine
+from models import upgrade_schema
+
+logger = logging.getLogger("bootstrap")
+
+BOOTSTRAP_TIMEOUT_SECONDS = float(os.getenv("BOOTSTRAP_TIMEOUT_SECONDS", "60"))
+BOOTSTRAP_RETRY_SECONDS = float(os.getenv("BOOTSTRAP_RETRY_SECONDS", "2"))
+# رقم ثابت للـ advisory lock بتاع الـ schema
+SCHEMA_LOCK_ID = 720_011
+
+def wait_for_database(engine, timeout: float = BOOTSTRAP_TIMEOUT_SECONDS):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return
+        except exc.DBAPIError as e:
+            if time.monotonic() >= deadline:
+                raise
+            logger.warning("database not reachable yet (%s), retrying in %.0fs", e.orig, BOOTSTRAP_RETRY_SECONDS)
+            time.sleep(BOOTSTRAP_RETRY_SECONDS)
+
+@contextmanager
+def schema_lock(engine):
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": SCHEMA_LOCK_ID})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": SCHEMA_LOCK_ID})
+
+def create_schema(engine):
+    with schema_lock(engine):
+        Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    started = time.perf_counter()
+    engine = get_engine()
+    wait_for_database(engine)
+    create_schema(engine)
+    engine.dispose()
+    logger.info("schema ready in %.2fs", time.perf_counter() - started)
+
+if __name__ == "__main__":
+    main()
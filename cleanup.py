@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import os
+import time
+import crud
+
+logger = logging.getLogger(__name__)
+
+# المسح بيحصل على دفعات صغيرة بالـ id، وكل دفعة transaction لوحدها
+POST_CLEANUP_INTERVAL_SECONDS = int(os.getenv("POST_CLEANUP_INTERVAL_SECONDS", "600"))
+POST_CLEANUP_BATCH_SIZE = int(os.getenv("POST_CLEANUP_BATCH_SIZE", "500"))
+POST_CLEANUP_PAUSE_SECONDS = float(os.getenv("POST_CLEANUP_PAUSE_SECONDS", "0.05"))
+POST_CLEANUP_MAX_SECONDS = float(os.getenv("POST_CLEANUP_MAX_SECONDS", "30"))
+
+class PostCleanup:
+    """بيمسح بوستات الأيام اللي فاتت من غير transaction واحدة كبيرة.
+
+    كل تشغيلة ليها حد أقصى للوقت؛ اللي يفضل بيتمسح في التشغيلة اللي بعدها
+    لأنها بتبدأ من أقدم بوست لسه موجود.
+    """
+
+    def __init__(self, batch_size: int = POST_CLEANUP_BATCH_SIZE, pause: float = POST_CLEANUP_PAUSE_SECONDS,
+                 max_seconds: float = POST_CLEANUP_MAX_SECONDS):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.max_seconds = max_seconds
+        self.runs = 0
+        self.posts_deleted = 0
+        self.comments_deleted = 0
+        self.likes_deleted = 0
+        self.seconds_total = 0.0
+        self.checkpoint = None
+        self.last_run = None
+
+    async def run(self, db, on_batch=None):
+        started = time.perf_counter()
+        run = {"batches": 0, "posts": 0, "comments": 0, "likes": 0, "finished": True}
+        first_id, last_id, before = await crud.old_posts_range(db)
+        while first_id is not None and first_id <= last_id:
+            if time.perf_counter() - started > self.max_seconds:
+                run["finished"] = False
+                break
+            batch_last = min(first_id + self.batch_size - 1, last_id)
+            deleted = await crud.delete_posts_in_range(db, first_id, batch_last, before)
+            run["batches"] += 1
+            run["posts"] += len(deleted)
+            run["likes"] += sum(likes for _, likes, _ in deleted)
+            run["comments"] += sum(comments for _, _, comments in deleted)
+            self.checkpoint = batch_last
+            logger.debug("post cleanup checkpoint %s (%d posts so far)", batch_last, run["posts"])
+            if deleted and on_batch is not None:
+                await on_batch([post_id for post_id, _, _ in deleted])
+            first_id = batch_last + 1
+            # نسيب الـ event loop والداتابيز للـ requests بين كل دفعة والتانية
+            await asyncio.sleep(self.pause)
+
+        run["seconds"] = time.perf_counter() - started
+        run["checkpoint"] = self.checkpoint
+        self.runs += 1
+        self.posts_deleted += run["posts"]
+        self.comments_deleted += run["comments"]
+        self.likes_deleted += run["likes"]
+        self.seconds_total += run["seconds"]
+        self.last_run = run
+        if run["posts"]:
+            logger.info(
+                "post cleanup removed %d posts, %d comments, %d likes in %.2fs (%d batches)",
+                run["posts"], run["comments"], run["likes"], run["seconds"], run["batches"]
+            )
+        return run
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "posts_deleted": self.posts_deleted,
+            "comments_deleted": self.comments_deleted,
+            "likes_deleted": self.likes_deleted,
+            "seconds_total": self.seconds_total,
+            "checkpoint": self.checkpoint,
+            "last_run": self.last_run,
+        }
+
+post_cleanup = PostCleanup()
@@ -1,33 +1,68 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from models import User, Message, Post, Comment, Like, Notification
-from datetime import datetime
-import bcrypt
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy import func, case, cast, or_, and_, select, insert, update, delete, union_all, literal, BigInteger, Date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from models import User, Message, Post, Comment, Like, Notification, DailyPostQuota, DailyPostClaim, RevokedSession
+from dto import UserRow, CommentRow, MessageRow
+from feed_cache import feed_cache
+from notifications import notification_queue
+from datetime import datetime, date, time, timedelta
+import base64
+import json
+import zlib
+
+# ------------------------ الـ cursors ------------------------ #
+
+def _encode_cursor(*values):
+    raw = json.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def _decode_cursor(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeEncodeError):
+        raise ValueError("Invalid cursor")
 
 # ------------------------ تسجيل مستخدم وتسجيل دخول ------------------------ #
 
-def create_user(db: Session, username: str, password: str):
-    hashed_pw = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    user = User(username=username, password=hashed_pw)
+async def create_user(db: AsyncSession, username: str, hashed_password: str):
+    user = User(username=username, password=hashed_password)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
-def get_user_by_username(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+async def get_user_by_username(db: AsyncSession, username: str):
+    return await db.scalar(select(User).where(User.username == username))
 
-def verify_user(db: Session, username: str, password: str):
-    user = get_user_by_username(db, username)
-    if not user:
-        return None
-    if bcrypt.checkpw(password.encode('utf-8'), user.password.encode('utf-8')):
-        return user
-    return None
+async def update_user_password(db: AsyncSession, user: User, hashed_password: str):
+    user.password = hashed_password
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+# ------------------------ الجلسات ------------------------ #
+
+async def revoke_session(db: AsyncSession, token_key: str, expires_at: int):
+    await db.execute(
+        _insert(db, RevokedSession).values(token_key=token_key, expires_at=expires_at).on_conflict_do_nothing()
+    )
+    await db.commit()
+
+async def is_session_revoked(db: AsyncSession, token_key: str):
+    return await db.scalar(select(RevokedSession.token_key).where(RevokedSession.token_key == token_key)) is not None
+
+async def prune_revoked_sessions(db: AsyncSession):
+    # التوكن المنتهي بيترفض لوحده، فمالوش لازمة في الجدول
+    result = await db.execute(delete(RevokedSession).where(RevokedSession.expires_at < int(datetime.utcnow().timestamp())))
+    await db.commit()
+    return result.rowcount
 
 # ------------------------ الشات القديم ------------------------ #
 
-def create_message(db: Session, sender: str, receiver: str, content: str, timestamp: str = None):
+async def create_message(db: AsyncSession, sender: str, receiver: str, content: str, timestamp: str = None):
     if timestamp:
         try:
             timestamp = datetime.fromisoformat(timestamp)
@@ -43,205 +78,677 @@ def create_message(db: Session, sender: str, receiver: str, content: str, timest
         timestamp=timestamp
     )
     db.add(message)
-    db.commit()
-    db.refresh(message)
+    await db.commit()
+    await db.refresh(message)
     return message
 
-def get_all_messages(db: Session):
-    return db.query(Message).order_by(Message.timestamp.desc()).all()
-
-def get_all_users(db: Session):
-    return db.query(User).all()
+def serialize_message(message: Message):
+    return {
+        "id": message.id,
+        "sender": message.sender,
+        "receiver": message.receiver,
+        "content": message.content,
+        "timestamp": message.timestamp.isoformat()
+    }
 
-def get_user(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+MESSAGE_COLUMNS = (Message.id, Message.sender, Message.receiver, Message.content, Message.timestamp)
+
+async def get_message(db: AsyncSession, message_id: int):
+    row = (await db.execute(select(*MESSAGE_COLUMNS).where(Message.id == message_id))).first()
+    return MessageRow(*row) if row else None
+
+def _encode_message_cursor(message):
+    return _encode_cursor(message.timestamp.isoformat(), message.id)
+
+def _decode_message_cursor(cursor: str):
+    try:
+        timestamp, message_id = _decode_cursor(cursor)
+        return datetime.fromisoformat(timestamp), int(message_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def _conversation_query(user: str, peer: str, newer_than=None, older_than=None, limit: int = 50):
+    # كل اتجاه بيتقري من ix_messages_conversation لوحده وبعدين بندمج النتيجتين
+    descending = newer_than is None
+    order = (Message.timestamp.desc(), Message.id.desc()) if descending else (Message.timestamp.asc(), Message.id.asc())
+
+    sides = []
+    for sender, receiver in ((user, peer), (peer, user)):
+        side = select(*MESSAGE_COLUMNS).where(Message.sender == sender, Message.receiver == receiver)
+        if older_than:
+            timestamp, message_id = older_than
+            side = side.where(or_(
+                Message.timestamp < timestamp,
+                and_(Message.timestamp == timestamp, Message.id < message_id)
+            ))
+        if newer_than:
+            timestamp, message_id = newer_than
+            side = side.where(or_(
+                Message.timestamp > timestamp,
+                and_(Message.timestamp == timestamp, Message.id > message_id)
+            ))
+        sides.append(side.order_by(*order).limit(limit).subquery().select())
+        if sender == receiver:
+            break
+
+    merged = union_all(*sides).subquery()
+    if descending:
+        return select(merged).order_by(merged.c.timestamp.desc(), merged.c.id.desc()).limit(limit)
+    return select(merged).order_by(merged.c.timestamp.asc(), merged.c.id.asc()).limit(limit)
+
+async def get_conversation(db: AsyncSession, user: str, peer: str, limit: int, before: str = None):
+    # صفحات من الأحدث للأقدم: next_cursor (أقدم رسالة) مع before للصفحة اللي بعدها،
+    # و latest_cursor (أحدث رسالة) مع since للـ polling
+    older_than = _decode_message_cursor(before) if before else None
+    messages = [MessageRow(*row) for row in await db.execute(
+        _conversation_query(user, peer, older_than=older_than, limit=limit + 1)
+    )]
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = _encode_message_cursor(messages[-1])
+    latest_cursor = _encode_message_cursor(messages[0]) if messages else None
+    if latest_cursor is None and before is None:
+        # محادثة فاضية: الـ polling يبدأ من الأول
+        latest_cursor = _encode_cursor(datetime.min.isoformat(), 0)
+    return {"messages": messages, "next_cursor": next_cursor, "latest_cursor": latest_cursor}
+
+async def get_conversation_since(db: AsyncSession, user: str, peer: str, since: str, limit: int):
+    # وضع الـ polling: الرسايل الجديدة بس بعد آخر cursor عند الـ client، من الأقدم للأحدث
+    messages = [MessageRow(*row) for row in await db.execute(
+        _conversation_query(user, peer, newer_than=_decode_message_cursor(since), limit=limit)
+    )]
+    latest_cursor = _encode_message_cursor(messages[-1]) if messages else since
+    return {"messages": messages, "next_cursor": latest_cursor, "latest_cursor": latest_cursor}
+
+async def get_all_users(db: AsyncSession):
+    # الأعمدة اللي بتترجع بس، من غير password ومن غير ORM objects
+    return [UserRow(*row) for row in await db.execute(select(User.id, User.username))]
+
+async def get_user(db: AsyncSession, username: str):
+    return await db.scalar(select(User).where(User.username == username))
 
 # ------------------------ البوستات اليومية ------------------------ #
 
-def create_post(db: Session, user_id: int, content: str):
-    today = datetime.utcnow().date()
-
-    existing_post = db.query(Post).filter(
-        Post.user_id == user_id,
-        func.date(Post.timestamp) == today
-    ).first()
-    if existing_post:
+def _day_bounds(day: date = None):
+    # فترة نص مفتوحة [بداية اليوم، بداية اليوم اللي بعده) عشان الـ index على timestamp يشتغل
+    start = datetime.combine(day or datetime.utcnow().date(), time.min)
+    return start, start + timedelta(days=1)
+
+DAILY_POST_LIMIT = 20
+
+def _insert(db: AsyncSession, model):
+    # INSERT بيدعم ON CONFLICT حسب نوع الداتابيز
+    if db.bind.dialect.name == "postgresql":
+        return pg_insert(model)
+    return sqlite_insert(model)
+
+async def _claim_daily_post(db: AsyncSession, user_id: int, day: date):
+    # كل خطوة statement واحد ذري، والاتنين جوه نفس الـ transaction بتاع البوست
+    claimed = await db.scalar(
+        _insert(db, DailyPostClaim)
+        .values(day=day, user_id=user_id)
+        .on_conflict_do_nothing()
+        .returning(DailyPostClaim.user_id)
+    )
+    if claimed is None:
         raise Exception("User already posted today.")
 
-    post_count_today = db.query(Post).filter(
-        func.date(Post.timestamp) == today
-    ).count()
-    if post_count_today >= 20:
+    stmt = _insert(db, DailyPostQuota).values(day=day, used=1)
+    used = await db.scalar(
+        stmt.on_conflict_do_update(
+            index_elements=[DailyPostQuota.day],
+            set_={"used": DailyPostQuota.used + 1},
+            where=DailyPostQuota.used < DAILY_POST_LIMIT
+        ).returning(DailyPostQuota.used)
+    )
+    if used is None:
         raise Exception("Daily post limit for the server reached.")
 
+async def _release_daily_post(db: AsyncSession, user_id: int, day: date):
+    await db.execute(delete(DailyPostClaim).where(DailyPostClaim.day == day, DailyPostClaim.user_id == user_id))
+    await db.execute(
+        update(DailyPostQuota)
+        .where(DailyPostQuota.day == day, DailyPostQuota.used > 0)
+        .values(used=DailyPostQuota.used - 1)
+    )
+
+async def create_post(db: AsyncSession, user_id: int, content: str):
+    try:
+        await _claim_daily_post(db, user_id, datetime.utcnow().date())
+    except Exception:
+        await db.rollback()
+        raise
+
     post = Post(user_id=user_id, content=content)
     db.add(post)
-    db.commit()
-    db.refresh(post)
+    await db.commit()
+    await db.refresh(post)
     return post
 
-def get_today_posts(db: Session):
+async def get_post_quota(db: AsyncSession, user_id: int):
     today = datetime.utcnow().date()
-    return db.query(Post).filter(func.date(Post.timestamp) == today).order_by(Post.timestamp.desc()).all()
+    used = await db.scalar(select(DailyPostQuota.used).where(DailyPostQuota.day == today)) or 0
+    posted = await db.scalar(
+        select(DailyPostClaim.user_id).where(DailyPostClaim.day == today, DailyPostClaim.user_id == user_id)
+    ) is not None
+    remaining = max(DAILY_POST_LIMIT - used, 0)
+    return {
+        "day": today.isoformat(),
+        "server_limit": DAILY_POST_LIMIT,
+        "server_remaining": remaining,
+        "user_posted_today": posted,
+        "can_post": not posted and remaining > 0
+    }
 
-def delete_old_posts(db: Session):
+async def reconcile_post_quota(db: AsyncSession):
+    # بيكمل الناقص بس (ميقللش أبدًا)، عشان ميسمحش بأكتر من الحد لو فيه بوست لسه بيتكتب
     today = datetime.utcnow().date()
-    db.query(Post).filter(Post.timestamp < today).delete()
-    db.commit()
-
-# ------------------------ التعليقات ------------------------ #
-
-def add_comment(db: Session, user_id: int, post_id: int, content: str):
-    comment = Comment(user_id=user_id, post_id=post_id, content=content)
-    db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    day_start, day_end = _day_bounds(today)
+    today_posts = (Post.timestamp >= day_start, Post.timestamp < day_end)
+
+    # الـ WHERE لازم تبقى في الـ SELECT نفسه، SQLite مبيفهمش ON CONFLICT بعد SELECT من غيرها
+    posters = select(literal(today, Date), Post.user_id).where(*today_posts).distinct()
+    await db.execute(
+        _insert(db, DailyPostClaim)
+        .from_select(["day", "user_id"], posters)
+        .on_conflict_do_nothing()
+    )
+    posted = await db.scalar(select(func.count(Post.id)).where(*today_posts))
+    stmt = _insert(db, DailyPostQuota).values(day=today, used=posted)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[DailyPostQuota.day],
+        set_={"used": stmt.excluded.used},
+        where=DailyPostQuota.used < stmt.excluded.used
+    ))
+    await db.commit()
+
+async def get_today_posts(db: AsyncSession):
+    day_start, day_end = _day_bounds()
+    return (await db.scalars(
+        select(Post).where(Post.timestamp >= day_start, Post.timestamp < day_end).order_by(Post.timestamp.desc())
+    )).all()
+
+async def old_posts_range(db: AsyncSession):
+    # أصغر وأكبر id قبل النهارده من الـ indexes؛ مش id أقدم وأحدث timestamp،
+    # لأن الترتيبين ممكن يختلفوا (inserts في نفس الوقت أو فرق في الساعة) فالـ range يبقى مقلوب
+    day_start, _ = _day_bounds()
+    first_id, last_id = (await db.execute(
+        select(func.min(Post.id), func.max(Post.id)).where(Post.timestamp < day_start)
+    )).one()
+    return first_id, last_id, day_start
+
+async def delete_posts_in_range(db: AsyncSession, first_id: int, last_id: int, before: datetime):
+    # الكومنتات واللايكات بتتمسح بـ ON DELETE CASCADE في الداتابيز، والعدادات بتقول اتمسح كام
+    deleted = (await db.execute(
+        delete(Post)
+        .where(Post.id >= first_id, Post.id <= last_id, Post.timestamp < before)
+        .returning(Post.id, Post.likes_count, Post.comments_count)
+    )).all()
+    await db.commit()
+    return deleted
+
+# ------------------------ عدادات البوست ------------------------ #
+
+async def _bump_post_counter(db: AsyncSession, post_id: int, column, delta: int):
+    # تحديث ذري جوه نفس الـ transaction بتاع الإضافة/الحذف، وبيرجع 0 لو البوست مش موجود
+    result = await db.execute(
+        update(Post).where(Post.id == post_id).values({column: column + delta}),
+        execution_options={"synchronize_session": False}
+    )
+    return result.rowcount
 
-    # ✅ تحميل العلاقة يدويًا بعد الإضافة
-    db.refresh(comment)
-    comment.user = db.query(User).filter(User.id == comment.user_id).first()
+async def reconcile_post_counters(db: AsyncSession):
+    likes_actual = (
+        select(func.count(Like.id)).where(Like.post_id == Post.id).scalar_subquery()
+    )
+    comments_actual = (
+        select(func.count(Comment.id)).where(Comment.post_id == Post.id).scalar_subquery()
+    )
+    result = await db.execute(
+        update(Post).where(or_(
+            Post.likes_count != likes_actual,
+            Post.comments_count != comments_actual
+        )).values({Post.likes_count: likes_actual, Post.comments_count: comments_actual}),
+        execution_options={"synchronize_session": False}
+    )
+    await db.commit()
+    return result.rowcount
 
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if post and post.user_id != user_id:
-        create_notification(db, post.user_id, f"{comment.user.username} علق على بوستك")
+# ------------------------ التعليقات ------------------------ #
 
+def _serialize_comment(c: Comment):
     return {
-        "id": comment.id,
-        "user_id": comment.user_id,
-        "post_id": comment.post_id,
-        "content": comment.content,
-        "timestamp": comment.timestamp.isoformat(),
-        "username": comment.user.username if comment.user else "مجهول"
+        "id": c.id,
+        "user_id": c.user_id,
+        "post_id": c.post_id,
+        "content": c.content,
+        "timestamp": c.timestamp.isoformat(),
+        "username": c.user.username if c.user else "مجهول"
     }
 
-def get_comments_for_post(db: Session, post_id: int):
-    return db.query(Comment).filter(Comment.post_id == post_id).order_by(Comment.timestamp.asc()).all()
+async def add_comment(db: AsyncSession, user_id: int, post_id: int, content: str):
+    # العداد الأول: لو البوست مش موجود منوصلش لـ INSERT يكسر الـ foreign key
+    if not await _bump_post_counter(db, post_id, Post.comments_count, 1):
+        await db.rollback()
+        raise Exception("Post not found")
+    comment = Comment(user_id=user_id, post_id=post_id, content=content)
+    db.add(comment)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # الـ foreign key الوحيد الباقي هو user_id، ومنرجعش الـ SQL للـ client
+        await db.rollback()
+        raise Exception("User not found")
+
+    # ✅ تحميل العلاقة يدويًا بعد الإضافة (مفيش lazy loading مع async)
+    await db.refresh(comment, ["user"])
+    notification_queue.enqueue("comment", user_id, post_id)
+
+    return _serialize_comment(comment)
+
+async def get_comments_for_post(db: AsyncSession, post_id: int):
+    return [CommentRow(*row) for row in await db.execute(
+        select(Comment.id, Comment.user_id, Comment.post_id, Comment.content, Comment.timestamp)
+        .where(Comment.post_id == post_id)
+        .order_by(Comment.timestamp.asc())
+    )]
 
 #هنااااا
-def edit_comment(db: Session, comment_id: int, user_id: int, new_content: str):
-    comment = db.query(Comment).filter(Comment.id == comment_id, Comment.user_id == user_id).first()
+async def edit_comment(db: AsyncSession, comment_id: int, user_id: int, new_content: str):
+    comment = await db.scalar(select(Comment).where(Comment.id == comment_id, Comment.user_id == user_id))
     if comment:
         comment.content = new_content
-        db.commit()
-        db.refresh(comment)
+        await db.commit()
+        await db.refresh(comment)
         return comment
     raise Exception("Comment not found or not yours")
 
 
-def delete_comment(db: Session, comment_id: int, user_id: int):
-    comment = db.query(Comment).filter(Comment.id == comment_id, Comment.user_id == user_id).first()
+async def delete_comment(db: AsyncSession, comment_id: int, user_id: int):
+    comment = await db.scalar(select(Comment).where(Comment.id == comment_id, Comment.user_id == user_id))
     if comment:
-        db.delete(comment)
-        db.commit()
-        return {"message": "Comment deleted"}
+        await db.delete(comment)
+        post_id = comment.post_id
+        await _bump_post_counter(db, post_id, Post.comments_count, -1)
+        await db.commit()
+        return {"message": "Comment deleted", "post_id": post_id}
     raise Exception("Comment not found or not yours")
 
 # ------------------------ اللايكات ------------------------ #
 
-def like_post(db: Session, user_id: int, post_id: int):
-    existing_like = db.query(Like).filter_by(user_id=user_id, post_id=post_id).first()
-    if existing_like:
-        return existing_like
-
-    like = Like(user_id=user_id, post_id=post_id)
-    db.add(like)
-    db.commit()
-    db.refresh(like)
-
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if post and post.user_id != user_id:
-        create_notification(db, post.user_id, f"{get_user(db, user_id).username} عمل لايك على بوستك")
-
-    return like
-
-def count_likes_for_post(db: Session, post_id: int):
-    return db.query(Like).filter(Like.post_id == post_id).count()
-#هناااااا
-def remove_like(db: Session, user_id: int, post_id: int):
-    like = db.query(Like).filter(Like.user_id == user_id, Like.post_id == post_id).first()
-    if like:
-        db.delete(like)
-        db.commit()
-        return {"message": "Like removed"}
-    raise Exception("Like not found")
+LIKE_BATCH_LIMIT = 500
+
+async def _apply_likes(db: AsyncSession, user_id: int, like_ids: list, unlike_ids: list):
+    # كل اتجاه statement واحد: INSERT ... ON CONFLICT DO NOTHING و DELETE، والـ RETURNING بيقول إيه اللي اتغير فعلًا
+    added, removed = [], []
+    if like_ids:
+        try:
+            added = (await db.scalars(
+                _insert(db, Like)
+                .from_select(["user_id", "post_id"], select(literal(user_id), Post.id).where(Post.id.in_(like_ids)))
+                .on_conflict_do_nothing()
+                .returning(Like.post_id)
+            )).all()
+        except IntegrityError:
+            # الـ conflict على (user_id, post_id) متعالج، فده الـ foreign key بتاع user_id
+            await db.rollback()
+            raise Exception("User not found")
+    if unlike_ids:
+        removed = (await db.scalars(
+            delete(Like).where(Like.user_id == user_id, Like.post_id.in_(unlike_ids)).returning(Like.post_id)
+        )).all()
+
+    counts = {}
+    for post_ids, delta in ((added, 1), (removed, -1)):
+        if post_ids:
+            counts.update((await db.execute(
+                update(Post).where(Post.id.in_(post_ids))
+                .values(likes_count=Post.likes_count + delta)
+                .returning(Post.id, Post.likes_count),
+                execution_options={"synchronize_session": False}
+            )).all())
+    unchanged = [post_id for post_id in (*like_ids, *unlike_ids) if post_id not in counts]
+    if unchanged:
+        counts.update((await db.execute(select(Post.id, Post.likes_count).where(Post.id.in_(unchanged)))).all())
+    await db.commit()
+
+    for post_id in added:
+        notification_queue.enqueue("like", user_id, post_id)
+    return set(added) | set(removed), counts
+
+async def _set_like(db: AsyncSession, user_id: int, post_id: int, liked: bool):
+    changed, counts = await _apply_likes(db, user_id, [post_id] if liked else [], [] if liked else [post_id])
+    if post_id not in counts:
+        raise Exception("Post not found")
+    return {"post_id": post_id, "liked": liked, "likes_count": counts[post_id], "changed": post_id in changed}
+
+async def like_post(db: AsyncSession, user_id: int, post_id: int):
+    # idempotent: اللايك التاني على نفس البوست مبيغيرش حاجة ومبيرجعش error
+    return await _set_like(db, user_id, post_id, True)
+
+async def remove_like(db: AsyncSession, user_id: int, post_id: int):
+    return await _set_like(db, user_id, post_id, False)
+
+async def apply_like_batch(db: AsyncSession, user_id: int, actions: list):
+    """بيطبق الحالة النهائية لكل بوست (آخر action ليه هو اللي بيكسب) في transaction واحدة."""
+    if len(actions) > LIKE_BATCH_LIMIT:
+        raise Exception(f"Too many like actions (max {LIKE_BATCH_LIMIT})")
+    final = {}
+    for post_id, liked in actions:
+        final[post_id] = liked
+    changed, counts = await _apply_likes(
+        db, user_id,
+        [post_id for post_id, liked in final.items() if liked],
+        [post_id for post_id, liked in final.items() if not liked]
+    )
+    return {
+        "results": [
+            {"post_id": post_id, "liked": liked, "likes_count": counts[post_id], "changed": post_id in changed}
+            for post_id, liked in final.items() if post_id in counts
+        ],
+        "not_found": [post_id for post_id in final if post_id not in counts]
+    }
+
+async def count_likes_for_post(db: AsyncSession, post_id: int):
+    likes_count = await db.scalar(select(Post.likes_count).where(Post.id == post_id))
+    return likes_count or 0
 
 # ------------------------ الإشعارات ------------------------ #
 
-def create_notification(db: Session, user_id: int, message: str):
+async def create_notification(db: AsyncSession, user_id: int, message: str):
     notification = Notification(user_id=user_id, message=message)
     db.add(notification)
-    db.commit()
-    db.refresh(notification)
+    await db.commit()
+    await db.refresh(notification)
     return notification
 
-def get_notifications(db: Session, user_id: int):
-    return db.query(Notification).filter_by(user_id=user_id).order_by(Notification.timestamp.desc()).all()
+NOTIFICATION_TEMPLATES = {
+    "like": ("{} عمل لايك على بوستك", "{} و {} آخرين عملوا لايك على بوستك"),
+    "comment": ("{} علق على بوستك", "{} و {} آخرين علقوا على بوستك"),
+}
 
-def mark_notifications_read(db: Session, user_id: int):
-    db.query(Notification).filter_by(user_id=user_id).update({"is_read": 1})
-    db.commit()
+def _coalesce_notification(kind: str, actor_name: str, actor_count: int):
+    single, many = NOTIFICATION_TEMPLATES[kind]
+    if actor_count == 1:
+        return single.format(actor_name)
+    return many.format(actor_name, actor_count - 1)
+
+def _unread_notifications_query(post_ids, kinds):
+    return select(Notification).where(
+        Notification.post_id.in_(post_ids), Notification.kind.in_(kinds), Notification.is_read == 0
+    )
+
+async def create_notifications(db: AsyncSession, events: list):
+    """بيكتب batch من (kind, actor_id, post_id) في insert واحد.
+
+    الأحداث على نفس البوست ومن نفس النوع بتتجمع في إشعار واحد
+    ("X و 9 آخرين ...") باسم آخر واحد عمل الحدث، وبتندمج كمان في إشعار
+    المستلم اللي لسه متقريش لنفس البوست والنوع: القديم بيتمسح والمدمج
+    بيتكتب من جديد عشان يطلع أول الصفحة. العدد تقريبي: نفس الشخص لو
+    رجع بعد حد تاني في batch تانية بيتحسب تاني.
+    """
+    post_ids = {post_id for _, _, post_id in events}
+    actor_ids = {actor_id for _, actor_id, _ in events}
+    owners = dict((await db.execute(select(Post.id, Post.user_id).where(Post.id.in_(post_ids)))).all())
+
+    groups = {}
+    for kind, actor_id, post_id in events:
+        owner_id = owners.get(post_id)
+        if owner_id is None or owner_id == actor_id or kind not in NOTIFICATION_TEMPLATES:
+            continue
+        actors = groups.setdefault((owner_id, kind, post_id), [])
+        if actor_id in actors:
+            actors.remove(actor_id)
+        actors.append(actor_id)
+    if not groups:
+        return []
+
+    # لو فيه كذا صف unread لنفس المفتاح (workers كتبوا في نفس الوقت) بنجمعهم كلهم
+    existing = {}
+    unread = await db.scalars(_unread_notifications_query(
+        {post_id for _, _, post_id in groups}, {kind for _, kind, _ in groups}
+    ))
+    for notification in unread:
+        key = (notification.user_id, notification.kind, notification.post_id)
+        if key in groups:
+            existing.setdefault(key, []).append(notification)
+
+    names = dict((await db.execute(select(User.id, User.username).where(User.id.in_(actor_ids)))).all())
+    rows = []
+    stale_ids = []
+    for (owner_id, kind, post_id), actors in groups.items():
+        actor_count = len(actors)
+        for previous in existing.get((owner_id, kind, post_id), []):
+            stale_ids.append(previous.id)
+            actor_count += (previous.actor_count or 1) - (previous.last_actor_id in actors)
+        rows.append({
+            "user_id": owner_id,
+            "message": _coalesce_notification(kind, names.get(actors[-1], "مجهول"), actor_count),
+            "timestamp": datetime.utcnow(),
+            "is_read": 0,
+            "post_id": post_id,
+            "kind": kind,
+            "actor_count": actor_count,
+            "last_actor_id": actors[-1],
+        })
+    if stale_ids:
+        await db.execute(delete(Notification).where(Notification.id.in_(stale_ids), Notification.is_read == 0))
+    notifications = (await db.scalars(insert(Notification).returning(Notification), rows)).all()
+    await db.commit()
+    return notifications
+
+def serialize_notification(notification: Notification):
+    return {
+        "id": notification.id,
+        "user_id": notification.user_id,
+        "message": notification.message,
+        "timestamp": notification.timestamp.isoformat(),
+        "is_read": notification.is_read
+    }
+
+def _decode_notification_cursor(cursor: str):
+    try:
+        (notification_id,) = _decode_cursor(cursor)
+        return int(notification_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+async def get_notifications(db: AsyncSession, user_id: int, limit: int = 50, before: str = None):
+    # من الأحدث للأقدم على ix_notifications_user_id_id: next_cursor (أقدم إشعار) مع before للصفحة اللي بعدها،
+    # و read_cursor (أحدث إشعار) مع up_to في mark-read
+    query = select(Notification).where(Notification.user_id == user_id)
+    if before:
+        query = query.where(Notification.id < _decode_notification_cursor(before))
+    notifications = (await db.scalars(query.order_by(Notification.id.desc()).limit(limit + 1))).all()
+    next_cursor = None
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        next_cursor = _encode_cursor(notifications[-1].id)
+    read_cursor = _encode_cursor(notifications[0].id) if notifications else None
+    return {"notifications": notifications, "next_cursor": next_cursor, "read_cursor": read_cursor}
+
+async def count_unread_notifications(db: AsyncSession, user_id: int):
+    # بيتقري من ix_notifications_user_id_is_read_timestamp بس من غير ما يلمس الجدول
+    return await db.scalar(
+        select(func.count()).select_from(Notification).where(Notification.user_id == user_id, Notification.is_read == 0)
+    )
+
+async def mark_notifications_read(db: AsyncSession, user_id: int, up_to: str = None):
+    # الإشعارات اللي لسه متقريتش بس، ولحد read_cursor لو موجود (اللي وصل بعد كده يفضل unread)
+    query = update(Notification).where(Notification.user_id == user_id, Notification.is_read == 0)
+    if up_to:
+        query = query.where(Notification.id <= _decode_notification_cursor(up_to))
+    result = await db.execute(query.values(is_read=1), execution_options={"synchronize_session": False})
+    await db.commit()
+    return result.rowcount
+
+NOTIFICATION_RETENTION_DAYS = 30
+NOTIFICATION_PRUNE_BATCH = 1000
+
+async def prune_read_notifications(db: AsyncSession, retention_days: int = NOTIFICATION_RETENTION_DAYS,
+                                   batch_size: int = NOTIFICATION_PRUNE_BATCH):
+    # الحذف على دفعات صغيرة، كل دفعة في transaction لوحدها عشان منقفلش الجدول
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    pruned = 0
+    while True:
+        ids = (await db.scalars(
+            select(Notification.id)
+            .where(Notification.timestamp < cutoff, Notification.is_read == 1)
+            .limit(batch_size)
+        )).all()
+        if not ids:
+            break
+        await db.execute(delete(Notification).where(Notification.id.in_(ids)))
+        await db.commit()
+        pruned += len(ids)
+        if len(ids) < batch_size:
+            break
+    return pruned
 
 # ------------------------ بوستات مع تفاصيل ------------------------ #
 
-def get_posts_with_details(db: Session, current_user_id: int):
-    posts = db.query(Post).order_by(Post.timestamp.desc()).all()
-    result = []
+FEED_SHUFFLE_MULTIPLIER = 48271
+FEED_SHUFFLE_MODULUS = 2147483647
+
+def _feed_shuffle_key(current_user_id: int):
+    # ترتيب عشوائي ثابت لكل مستخدم للبوستات اللي مفيهاش لايكات، محسوب جوه الـ SQL
+    seed = zlib.crc32(str(current_user_id).encode("utf-8"))
+    mixed = (cast(Post.id, BigInteger) * FEED_SHUFFLE_MULTIPLIER + seed) % FEED_SHUFFLE_MODULUS
+    return (mixed * mixed) % FEED_SHUFFLE_MODULUS
+
+def _encode_feed_cursor(likes_count: int, shuffle_key: int, post_id: int):
+    return _encode_cursor(likes_count, shuffle_key, post_id)
+
+def _decode_feed_cursor(cursor: str):
+    try:
+        likes_count, shuffle_key, post_id = _decode_cursor(cursor)
+        return int(likes_count), int(shuffle_key), int(post_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def _ranked_feed_query(current_user_id: int):
+    likes_count = Post.likes_count
+    shuffle_key = case((likes_count == 0, _feed_shuffle_key(current_user_id)), else_=0)
 
+    query = (
+        select(Post.id, likes_count.label("likes_count"), Post.comments_count, shuffle_key.label("shuffle_key"))
+        .order_by(likes_count.desc(), shuffle_key.asc(), Post.id.desc())
+    )
+    return query, likes_count, shuffle_key
+
+def _feed_entry_prefix(entry: dict):
+    # JSON البوست متحول مرة واحدة من غير القوس الأخير، والعدادات و liked_by_user بتتلزق في الآخر
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8")[:-1]
+
+async def _load_feed_entries(db: AsyncSession, post_ids):
+    # بنعيد تحميل البوستات اللي مش في الكاش بس (أو اللي اتغيرت)، وكل واحد bytes جاهزة
+    generation = feed_cache.generation()
+    entries = feed_cache.get_many(post_ids)
+    dirty_ids = [post_id for post_id in post_ids if post_id not in entries]
+    if not dirty_ids:
+        return entries
+
+    comments_by_post = {}
+    comments_db = await db.scalars(
+        select(Comment)
+        .options(joinedload(Comment.user))
+        .where(Comment.post_id.in_(dirty_ids))
+        .order_by(Comment.timestamp.asc())
+    )
+    for c in comments_db:
+        comments_by_post.setdefault(c.post_id, []).append(_serialize_comment(c))
+
+    posts = await db.scalars(select(Post).options(joinedload(Post.user)).where(Post.id.in_(dirty_ids)))
     for post in posts:
-        likes_count = db.query(Like).filter(Like.post_id == post.id).count()
-        liked_by_user = db.query(Like).filter(Like.post_id == post.id, Like.user_id == current_user_id).first() is not None
-
-        comments_db = db.query(Comment).filter(Comment.post_id == post.id).order_by(Comment.timestamp.asc()).all()
-        comments = []
-        for c in comments_db:
-            comments.append({
-                "id": c.id,
-                "user_id": c.user_id,
-                "post_id": c.post_id,
-                "content": c.content,
-                "timestamp": c.timestamp.isoformat(),
-                "username": c.user.username if c.user else "مجهول"
-            })
-
-        result.append({
+        entry = {
             "id": post.id,
             "user_id": post.user_id,
             "content": post.content,
             "timestamp": post.timestamp.isoformat(),
             "username": post.user.username if post.user else "مجهول",
-            "likes_count": likes_count,
-            "liked_by_user": liked_by_user,
-            "comments": comments
-        })
-
-    posts_with_likes = [p for p in result if p["likes_count"] > 0]
-    if posts_with_likes:
-        posts_with_likes.sort(key=lambda x: x["likes_count"], reverse=True)
-        no_likes = [p for p in result if p["likes_count"] == 0]
-        import random
-        random.shuffle(no_likes)
-        result = posts_with_likes + no_likes
-    else:
-        import random
-        random.shuffle(result)
-
-    return result
+            "comments": comments_by_post.get(post.id, [])
+        }
+        prefix = _feed_entry_prefix(entry)
+        feed_cache.set(post.id, prefix, generation)
+        entries[post.id] = prefix
+    return entries
+
+async def _feed_items(db: AsyncSession, current_user_id: int, rows):
+    post_ids = [row.id for row in rows]
+    if not post_ids:
+        return []
+
+    entries = await _load_feed_entries(db, post_ids)
+    liked_post_ids = set(await db.scalars(select(Like.post_id).where(
+        Like.user_id == current_user_id,
+        Like.post_id.in_(post_ids)
+    )))
+
+    # البوست اللي اتمسح بين استعلام الترتيب والتحميل بيتشال
+    return [(row, entries[row.id], row.id in liked_post_ids) for row in rows if row.id in entries]
+
+async def _render_feed_json(db: AsyncSession, current_user_id: int, rows):
+    # bytes جاهزة من غير ما نعيد serialize البوستات والتعليقات
+    return b"[" + b",".join(
+        prefix + b',"likes_count":%d,"comments_count":%d,"liked_by_user":%s}' % (
+            row.likes_count, row.comments_count, b"true" if liked else b"false"
+        )
+        for row, prefix, liked in await _feed_items(db, current_user_id, rows)
+    ) + b"]"
+
+async def get_feed_json(db: AsyncSession, current_user_id: int, limit: int = None, cursor: str = None):
+    """رد GET /posts كـ JSON bytes جاهزة للـ snapshot: كل الفيد، أو صفحة {"posts", "next_cursor"}.
+
+    عدد ثابت من الاستعلامات مهما كان عدد البوستات: ترتيب + لايكاتي (+ بوستات وتعليقات للي مش في الكاش).
+    """
+    if limit is None:
+        query, _, _ = _ranked_feed_query(current_user_id)
+        rows = (await db.execute(query)).all()
+        return await _render_feed_json(db, current_user_id, rows)
+    rows, next_cursor = await _feed_page_rows(db, current_user_id, limit, cursor)
+    posts = await _render_feed_json(db, current_user_id, rows)
+    return b'{"posts":' + posts + b',"next_cursor":' + json.dumps(next_cursor).encode("ascii") + b"}"
+
+async def _feed_page_rows(db: AsyncSession, current_user_id: int, limit: int, cursor: str = None):
+    query, likes_count, shuffle_key = _ranked_feed_query(current_user_id)
+    if cursor:
+        last_likes, last_shuffle, last_id = _decode_feed_cursor(cursor)
+        query = query.where(or_(
+            likes_count < last_likes,
+            and_(likes_count == last_likes, or_(
+                shuffle_key > last_shuffle,
+                and_(shuffle_key == last_shuffle, Post.id < last_id)
+            ))
+        ))
+
+    # نجيب صف زيادة عشان نعرف لو فيه صفحة بعدها
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_feed_cursor(last.likes_count, last.shuffle_key, last.id)
+    return rows, next_cursor
 
 # ------------------------ تعديل وحذف بوست ------------------------ #
 
-def update_post(db: Session, post_id: int, user_id: int, new_content: str):
-    post = db.query(Post).filter(Post.id == post_id, Post.user_id == user_id).first()
+async def update_post(db: AsyncSession, post_id: int, user_id: int, new_content: str):
+    post = await db.scalar(select(Post).where(Post.id == post_id, Post.user_id == user_id))
     if not post:
         raise Exception("Post not found or no permission to edit")
     post.content = new_content
-    db.commit()
-    db.refresh(post)
+    await db.commit()
+    await db.refresh(post)
     return post
 
-def delete_post(db: Session, post_id: int, user_id: int):
-    post = db.query(Post).filter(Post.id == post_id, Post.user_id == user_id).first()
+async def delete_post(db: AsyncSession, post_id: int, user_id: int):
+    post = await db.scalar(select(Post).where(Post.id == post_id, Post.user_id == user_id))
     if not post:
         raise Exception("Post not found or no permission to delete")
-    db.delete(post)
-    db.commit()
+    # بوست النهارده لما يتمسح بيرجع الحصة، زي ما كان الحساب القديم بيعمل
+    if post.timestamp.date() == datetime.utcnow().date():
+        await _release_daily_post(db, user_id, post.timestamp.date())
+    await db.delete(post)
+    await db.commit()
     return {"message": "Post deleted"}
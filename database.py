@@ -1,11 +1,199 @@
+import asyncio
 import os
-from sqlalchemy import create_engine
+import time
+from threading import Lock
+from sqlalchemy import create_engine, event, exc, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 # متغير البيئة اللي Railway بيحطه تلقائيًا
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+DB_READY_TIMEOUT = float(os.getenv("DB_READY_TIMEOUT", "2"))
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+# ------------------------ إحصائيات الـ pool ------------------------ #
+
+class PoolStats:
+    def __init__(self):
+        self._lock = Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+pool_stats = PoolStats()
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    # الوقت اللي الطلب بيستناه لحد ما ياخد connection (شامل الـ pre-ping)
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            pool_stats.incr("timeouts")
+            raise
+        finally:
+            pool_stats.record_wait(time.perf_counter() - started)
+
+def _pool_options(url):
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "poolclass": InstrumentedPool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def _connect_args(url):
+    if DB_STATEMENT_TIMEOUT_MS and url.get_backend_name() == "postgresql":
+        return {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return {}
+
+def _install_pool_listeners(pool):
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        pool_stats.incr("connects")
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_stats.incr("checkouts")
+        if isinstance(pool, AsyncAdaptedQueuePool) and pool.checkedout() > pool.size():
+            pool_stats.incr("overflow_checkouts")
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        pool_stats.incr("checkins")
+
+    @event.listens_for(pool, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        pool_stats.incr("invalidations")
+
+def _enable_sqlite_foreign_keys(engine):
+    # SQLite بيتجاهل ON DELETE CASCADE إلا لو الـ foreign keys متفعلة لكل connection
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+def pool_status():
+    pool = get_async_engine().sync_engine.pool
+    status = {
+        "pool_class": type(pool).__name__,
+        "checkouts": pool_stats.checkouts,
+        "checkins": pool_stats.checkins,
+        "connects": pool_stats.connects,
+        "invalidations": pool_stats.invalidations,
+        "overflow_checkouts": pool_stats.overflow_checkouts,
+        "timeouts": pool_stats.timeouts,
+        "wait_seconds_total": pool_stats.wait_seconds_total,
+        "wait_seconds_max": pool_stats.wait_seconds_max,
+        "wait_seconds_avg": pool_stats.wait_seconds_total / pool_stats.checkouts if pool_stats.checkouts else 0.0,
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update({
+            "size": pool.size(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+    return status
+
+# ------------------------ الـ engines ------------------------ #
+
+# الـ engines بتتعمل مع أول استخدام مش وقت الـ import، وأول connection بيتفتح مع أول query.
+# الـ schema نفسها بتتعمل في bootstrap.py قبل ما الـ workers تشتغل.
+_engine = None
+_async_engine = None
+_engine_lock = Lock()
+_session_factory = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+def database_url():
+    if not SQLALCHEMY_DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is not set")
+    return SQLALCHEMY_DATABASE_URL
+
+def get_engine():
+    # الـ engine العادي للـ schema بس (bootstrap والـ benchmarks)، وكل الـ endpoints بتستخدم الـ async
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine(database_url())
+            _enable_sqlite_foreign_keys(_engine)
+        return _engine
+
+def get_async_engine():
+    global _async_engine
+    with _engine_lock:
+        if _async_engine is None:
+            url = async_database_url(database_url())
+            _async_engine = create_async_engine(url, connect_args=_connect_args(url), **_pool_options(url))
+            _install_pool_listeners(_async_engine.sync_engine.pool)
+            _enable_sqlite_foreign_keys(_async_engine.sync_engine)
+            _session_factory.configure(bind=_async_engine)
+        return _async_engine
+
+def AsyncSessionLocal():
+    get_async_engine()
+    return _session_factory()
+
+_schema_ready = False
+
+async def check_ready(tables=(), timeout: float = DB_READY_TIMEOUT):
+    # الـ readiness probe: الداتابيز بترد، والجداول موجودة (يعني الـ bootstrap اشتغل)
+    async def check():
+        global _schema_ready
+        async with get_async_engine().connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            if _schema_ready or not tables:
+                return []
+            missing = await conn.run_sync(lambda sync_conn: [
+                table for table in tables if not inspect(sync_conn).has_table(table)
+            ])
+            # الجداول مبتختفيش، فبعد أول نجاح مش محتاجين نعمل reflection تاني
+            _schema_ready = not missing
+            return missing
+
+    missing = await asyncio.wait_for(check(), timeout)
+    if missing:
+        raise RuntimeError(f"missing tables: {', '.join(missing)}")
+
 Base = declarative_base()
@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+# صفوف خفيفة للـ endpoints اللي بتقرا بس: أعمدة محددة من غير ORM identity map
+# ومن غير pydantic، و orjson بيحولها لـ JSON مباشرة (بيفهم الـ dataclasses)
+
+@dataclass(slots=True)
+class UserRow:
+    id: int
+    username: str
+
+@dataclass(slots=True)
+class CommentRow:
+    id: int
+    user_id: int
+    post_id: int
+    content: str
+    timestamp: datetime
+
+@dataclass(slots=True)
+class MessageRow:
+    id: int
+    sender: str
+    receiver: str
+    content: str
+    timestamp: datetime
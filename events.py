@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import os
+from sqlalchemy.engine import make_url
+from database import database_url
+
+logger = logging.getLogger(__name__)
+
+# قناة واحدة في Postgres لكل الأحداث، والـ topic جوه الرسالة نفسها
+PG_EVENTS_CHANNEL = os.getenv("PG_EVENTS_CHANNEL", "gym_events")
+PG_RECONNECT_DELAY = float(os.getenv("PG_EVENTS_RECONNECT_DELAY", "2"))
+
+class InMemoryEventBus:
+    """للتشغيل بـ worker واحد: الحدث بيتسلم للـ handlers مباشرة."""
+
+    def __init__(self):
+        self.handlers = {}
+        self.reconnect_handlers = []
+
+    def subscribe(self, topic: str, handler):
+        self.handlers.setdefault(topic, []).append(handler)
+
+    def on_reconnect(self, handler):
+        # بيتنادى بعد ما الـ bus يرجع من انقطاع، لأن الأحداث اللي فاتت مش هترجع
+        self.reconnect_handlers.append(handler)
+
+    async def _dispatch(self, topic: str, message: dict):
+        for handler in self.handlers.get(topic, []):
+            try:
+                await handler(message)
+            except Exception:
+                logger.exception("event handler failed for topic %s", topic)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, topic: str, message: dict):
+        await self._dispatch(topic, message)
+
+class PostgresEventBus(InMemoryEventBus):
+    """LISTEN/NOTIFY: كل worker بيسمع على القناة ويبعت لـ clients بتوعه.
+
+    حتى الـ worker اللي نشر الحدث بيستلمه من Postgres، فكل الـ workers
+    بيتعاملوا مع الأحداث بنفس الطريقة.
+    """
+
+    def __init__(self, dsn: str, channel: str = PG_EVENTS_CHANNEL):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self._connection = None
+        self._publish_lock = asyncio.Lock()
+        self._reconnect_task = None
+        self._stopping = False
+
+    async def start(self):
+        self._stopping = False
+        try:
+            await self._listen()
+        except Exception:
+            # الـ worker ميقعش لو Postgres مش متاح وقت الـ startup، بيفضل يحاول في الخلفية
+            logger.exception("could not listen on %s, retrying in the background", self.channel)
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _listen(self):
+        import asyncpg
+
+        self._connection = await asyncpg.connect(self.dsn)
+        self._connection.add_termination_listener(self._on_terminated)
+        await self._connection.add_listener(self.channel, self._on_notify)
+
+    def _on_terminated(self, connection):
+        if not self._stopping and self._reconnect_task is None:
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        try:
+            while not self._stopping:
+                await asyncio.sleep(PG_RECONNECT_DELAY)
+                try:
+                    await self._listen()
+                    logger.info("reconnected to %s", self.channel)
+                    for handler in self.reconnect_handlers:
+                        handler()
+                    return
+                except Exception:
+                    logger.exception("could not reconnect to %s", self.channel)
+        finally:
+            self._reconnect_task = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            envelope = json.loads(payload)
+        except ValueError:
+            logger.warning("dropping malformed event payload on %s", channel)
+            return
+        asyncio.create_task(self._dispatch(envelope["topic"], envelope["message"]))
+
+    async def stop(self):
+        self._stopping = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    async def publish(self, topic: str, message: dict):
+        # بننشر على connection الـ LISTEN نفسها بدل ما ناخد واحدة من الـ pool،
+        # عشان الطلب اللي لسه ماسك connection ميستناش على تانية
+        payload = json.dumps({"topic": topic, "message": message}, ensure_ascii=False, separators=(",", ":"))
+        async with self._publish_lock:
+            if self._connection is not None and not self._connection.is_closed():
+                await self._connection.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+                return
+        # أثناء إعادة الاتصال على الأقل الـ worker ده يوصّل الحدث لنفسه
+        logger.warning("not connected to %s, delivering %s event locally only", self.channel, topic)
+        await self._dispatch(topic, message)
+
+def create_event_bus():
+    url = make_url(database_url())
+    backend = os.getenv("EVENT_BUS") or ("postgres" if url.get_backend_name() == "postgresql" else "memory")
+    if backend == "memory":
+        return InMemoryEventBus()
+    if backend == "postgres":
+        dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+        return PostgresEventBus(dsn)
+    raise ValueError(f"Unknown EVENT_BUS backend: {backend}")
+
+class EventBus(InMemoryEventBus):
+    """الـ bus اللي الـ app بيستخدمه: الـ handlers بتتسجل وقت الـ import،
+    والـ backend بيتعمل في start زي الـ engines، فالـ import مبيقراش DATABASE_URL.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.backend = None
+
+    async def start(self):
+        if self.backend is None:
+            self.backend = create_event_bus()
+            # نفس الـ dict والـ list، فأي subscribe بعد كده بيوصل للـ backend
+            self.backend.handlers = self.handlers
+            self.backend.reconnect_handlers = self.reconnect_handlers
+        await self.backend.start()
+
+    async def stop(self):
+        if self.backend is not None:
+            await self.backend.stop()
+
+    async def publish(self, topic: str, message: dict):
+        # قبل الـ startup (scripts أو tests) الحدث بيتسلم محليًا بس
+        if self.backend is None:
+            return await self._dispatch(topic, message)
+        await self.backend.publish(topic, message)
+
+event_bus = EventBus()
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+# كاش لكل بوست متعرض في الفيد (من غير liked_by_user لأنه بيختلف من مستخدم للتاني)
+class FeedCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        # آخر generation اتعمل فيه invalidate لكل بوست، عشان تحميل بدأ قبله ميتخزنش
+        self._invalidated = OrderedDict()
+        self._generation = 0
+        self._forgotten = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.stale_sets = 0
+
+    def get_many(self, post_ids):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for post_id in post_ids:
+                item = self._entries.get(post_id)
+                if item is None or item[0] < now:
+                    if item is not None:
+                        del self._entries[post_id]
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(post_id)
+                found[post_id] = item[1]
+                self.hits += 1
+        return found
+
+    def generation(self):
+        # بيتاخد قبل ما التحميل من الداتابيز يبدأ، ويتبعت لـ set
+        with self._lock:
+            return self._generation
+
+    def set(self, post_id: int, entry: bytes, generation: int):
+        with self._lock:
+            # لو البوست اتعمله invalidate بعد ما التحميل بدأ، الداتا دي قديمة ومش هتتخزن
+            if self._invalidated.get(post_id, self._forgotten) > generation:
+                self.stale_sets += 1
+                return
+            self._entries[post_id] = (time.monotonic() + self.ttl_seconds, entry)
+            self._entries.move_to_end(post_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, post_id: int):
+        with self._lock:
+            self._generation += 1
+            self._invalidated[post_id] = self._generation
+            self._invalidated.move_to_end(post_id)
+            # بنفتكر آخر max_entries بوست بس؛ أي تحميل أقدم من اللي اتنسى بيتعامل كأنه قديم
+            while len(self._invalidated) > self.max_entries:
+                _, self._forgotten = self._invalidated.popitem(last=False)
+            if self._entries.pop(post_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._forgotten = self._generation
+            self._invalidated.clear()
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "stale_sets": self.stale_sets,
+            }
+
+feed_cache = FeedCache(
+    max_entries=int(os.getenv("FEED_CACHE_MAX_ENTRIES", "1000")),
+    ttl_seconds=float(os.getenv("FEED_CACHE_TTL_SECONDS", "300")),
+)
+
+# ----------------- Feed snapshot -----------------
+FEED_SNAPSHOT_MAX_BODIES = int(os.getenv("FEED_SNAPSHOT_MAX_BODIES", "1000"))
+
+class FeedSnapshot:
+    """ردود GET /posts الجاهزة (bytes) لكل مستخدم وصفحة، مع ETag.
+
+    أي تغيير في بوست أو كومنت أو لايك بيزوّد الـ version، فكل الردود القديمة
+    بتتمسح مرة واحدة. الـ ETag hash للرد نفسه مش للـ version، فكل الـ workers
+    بيطلعوا نفس الـ ETag لنفس الفيد والـ If-None-Match بيشتغل على أي worker.
+    """
+
+    def __init__(self, max_bodies: int, ttl_seconds: float):
+        self.max_bodies = max_bodies
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._bodies = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self._bodies.clear()
+
+    @staticmethod
+    def etag(body: bytes):
+        return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+    @staticmethod
+    def matches(if_none_match: str, etag: str):
+        if not if_none_match:
+            return False
+        # المقارنة weak: W/"x" و "x" نفس الحاجة
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    def get(self, key, version: int):
+        now = time.monotonic()
+        with self._lock:
+            item = self._bodies.get(key)
+            if item is None or item[0] != version or item[1] < now:
+                self.misses += 1
+                return None
+            self._bodies.move_to_end(key)
+            self.hits += 1
+            return item[2], item[3]
+
+    def put(self, key, version: int, body: bytes):
+        etag = self.etag(body)
+        with self._lock:
+            # لو حصل تغيير أثناء بناء الرد، الرد ده قديم ومش هيتخزن
+            if version != self.version:
+                return etag
+            self._bodies[key] = (version, time.monotonic() + self.ttl_seconds, body, etag)
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self.max_bodies:
+                self._bodies.popitem(last=False)
+        return etag
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "bodies": len(self._bodies),
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+            }
+
+feed_snapshot = FeedSnapshot(
+    max_bodies=FEED_SNAPSHOT_MAX_BODIES,
+    ttl_seconds=float(os.getenv("FEED_CACHE_TTL_SECONDS", "300")),
+)
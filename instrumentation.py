@@ -0,0 +1,185 @@
+import contextvars
+import logging
+import os
+import time
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# 0 يعني الـ slow-request log مقفول
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS", "50"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestTrace:
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self, capture: bool):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = [] if capture else None
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+class RouteStats:
+    __slots__ = ("buckets", "count", "seconds", "queries", "db_seconds", "statuses")
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statuses = {}
+
+    def observe(self, seconds: float, status: int, trace: RequestTrace):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+        self.count += 1
+        self.seconds += seconds
+        self.queries += trace.queries
+        self.db_seconds += trace.db_seconds
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+class Metrics:
+    """عدادات لكل route + كل الـ SQL اللي بيتنفذ، وبتتعرض بصيغة Prometheus."""
+
+    def __init__(self, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.slow_request_ms = slow_request_ms
+        self.routes = {}
+        self.collectors = {}
+        self.engines = set()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slow_requests = 0
+
+    def register_collector(self, name: str, collect):
+        # أي dict أرقام (pool, cache, websockets...) بيتحول لـ gauges باسم name_key
+        self.collectors[name] = collect
+
+    def install_sql_hooks(self, engine):
+        # الـ engine بيتعمل مع أول startup، فممكن الدالة تتنادى أكتر من مرة لنفس الـ engine
+        if engine in self.engines:
+            return
+        self.engines.add(engine)
+
+        # وقت البداية بيتخزن على الـ execution context بتاع الـ statement نفسه، فالـ statement
+        # اللي بيفشل مبيسيبش حاجة معلقة على الـ connection
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            context._query_started = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, "_query_started", None)
+            if started is None:
+                return
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            trace = _current_trace.get()
+            if trace is None:
+                return
+            trace.queries += 1
+            trace.db_seconds += elapsed
+            if trace.statements is not None and len(trace.statements) < SLOW_REQUEST_MAX_STATEMENTS:
+                trace.statements.append((elapsed, statement))
+
+    def observe(self, scope, status: int, seconds: float, trace: RequestTrace):
+        route = scope.get("route")
+        # الـ path template مش الـ path نفسه، عشان /posts/1 و /posts/2 يبقوا route واحد
+        path = getattr(route, "path", None) or "unmatched"
+        key = (scope["method"], path)
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteStats()
+        stats.observe(seconds, status, trace)
+
+        if self.slow_request_ms and seconds * 1000 >= self.slow_request_ms:
+            self.slow_requests += 1
+            sql = "\n".join(f"  [{elapsed * 1000:.1f}ms] {statement}" for elapsed, statement in trace.statements)
+            logger.warning(
+                "slow request %s %s: %.1fms, %d queries, %.1fms in db\n%s",
+                scope["method"], scope["path"], seconds * 1000, trace.queries, trace.db_seconds * 1000, sql
+            )
+
+    def render(self):
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, path), stats in sorted(self.routes.items()):
+            labels = f'method="{method}",route="{_escape(path)}"'
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {stats.seconds}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {stats.count}")
+
+        lines += ["# HELP http_requests_total Requests by route and status.", "# TYPE http_requests_total counter"]
+        for (method, path), stats in sorted(self.routes.items()):
+            for status, count in sorted(stats.statuses.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{_escape(path)}",status="{status}"}} {count}')
+
+        lines += ["# HELP http_request_db_queries_total SQL statements issued by route.",
+                  "# TYPE http_request_db_queries_total counter"]
+        for (method, path), stats in sorted(self.routes.items()):
+            lines.append(f'http_request_db_queries_total{{method="{method}",route="{_escape(path)}"}} {stats.queries}')
+
+        lines += ["# HELP http_request_db_seconds_total Time spent in SQL by route.",
+                  "# TYPE http_request_db_seconds_total counter"]
+        for (method, path), stats in sorted(self.routes.items()):
+            lines.append(f'http_request_db_seconds_total{{method="{method}",route="{_escape(path)}"}} {stats.db_seconds}')
+
+        lines += [
+            "# TYPE db_queries_total counter", f"db_queries_total {self.queries}",
+            "# TYPE db_query_seconds_total counter", f"db_query_seconds_total {self.db_seconds}",
+            "# TYPE http_slow_requests_total counter", f"http_slow_requests_total {self.slow_requests}",
+        ]
+        for name, collect in self.collectors.items():
+            for key, value in _flatten(name, collect()):
+                lines += [f"# TYPE {key} gauge", f"{key} {value}"]
+        return "\n".join(lines) + "\n"
+
+def _escape(value: str):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+def _flatten(prefix: str, values: dict):
+    for key, value in values.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+metrics = Metrics()
+
+class MetricsMiddleware:
+    """ASGI middleware خفيف (من غير BaseHTTPMiddleware) بيقيس كل HTTP request."""
+
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trace = RequestTrace(capture=self.registry.slow_request_ms > 0)
+        token = _current_trace.set(trace)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            self.registry.observe(scope, status, time.perf_counter() - started, trace)
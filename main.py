@@ -1,38 +1,150 @@
-from fastapi import FastAPI, HTTPException, Depends, Query, WebSocket, WebSocketDisconnect
+from fastapi import (
+    FastAPI, HTTPException, Depends, Header, Query, Request, Response,
+    WebSocket, WebSocketDisconnect, WebSocketException
+)
 from fastapi_utils.tasks import repeat_every
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine, Base
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import JSONResponse, PlainTextResponse
+from database import AsyncSessionLocal, get_async_engine, check_ready, pool_status, Base
 from typing import List
 from datetime import datetime
+import json
+import logging
+import orjson
 import crud
+import passwords
+from feed_cache import feed_cache, feed_snapshot
+from realtime import ConnectionManager, UserConnectionManager, PresenceStore
+from events import event_bus
+from notifications import notification_queue
+from cleanup import post_cleanup, POST_CLEANUP_INTERVAL_SECONDS
+from instrumentation import metrics, MetricsMiddleware
+from sessions import session_store, token_key, InvalidSession, Session, SESSION_REQUIRED
 from models import User, Message, Post, Comment, Like, Notification
 
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+# الـ schema بتتعمل مرة واحدة قبل الـ deploy (python -m bootstrap)، مش مع import كل worker
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
 
-# ----------------- WebSocket Manager -----------------
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+@app.on_event("startup")
+async def prepare_database() -> None:
+    metrics.install_sql_hooks(get_async_engine().sync_engine)
+    # بنفتح أول connection هنا بدل أول request، ولو الداتابيز مش متاحة الـ worker بيقوم برضه
+    # والـ /health/ready هو اللي بيقول إمتى يستقبل traffic
+    try:
+        await check_ready(Base.metadata.tables)
+    except Exception as e:
+        logger.warning("database is not ready yet: %s", e)
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# ----------------- Database Dependency -----------------
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
 
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+# ----------------- Sessions -----------------
+def unauthorized(detail: str):
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+def bearer_token(authorization: str | None):
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise unauthorized("Invalid authorization header")
+    return token
+
+async def read_session(token: str | None, db: AsyncSession):
+    if not token:
+        if SESSION_REQUIRED:
+            raise InvalidSession("Not authenticated")
+        return None
+    return await session_store.validate(token, lambda key: crud.is_session_revoked(db, key))
+
+def claimed_identity(actual, claimed):
+    # actual جاي من التوكن (None لو مفيش توكن)، و claimed هو اللي العميل بعته في الطلب
+    if actual is None:
+        if claimed is None:
+            raise InvalidSession("Not authenticated")
+        return claimed
+    if claimed is not None and claimed != actual:
+        raise PermissionError("Request identity does not match the session")
+    return actual
+
+async def get_session(authorization: str | None = Header(None), db: AsyncSession = Depends(get_db)):
+    # من الكاش، أو HMAC + سؤال revoked_sessions أول مرة بس، من غير جدول users ولا bcrypt
+    try:
+        return await read_session(bearer_token(authorization), db)
+    except InvalidSession as e:
+        raise unauthorized(str(e))
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
+def acting_user(session: Session | None, user_id: int | None):
+    try:
+        return claimed_identity(session.user_id if session else None, user_id)
+    except InvalidSession as e:
+        raise unauthorized(str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
 
+def acting_username(session: Session | None, username: str | None):
+    try:
+        return claimed_identity(session.username if session else None, username)
+    except InvalidSession as e:
+        raise unauthorized(str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+async def websocket_identity(token: str | None, claimed, field: str):
+    # المتصفح مبيقدرش يبعت header مع الـ WebSocket، فالتوكن بييجي في ?token=
+    try:
+        async with AsyncSessionLocal() as db:
+            session = await read_session(token, db)
+        return claimed_identity(getattr(session, field) if session else None, claimed)
+    except (InvalidSession, PermissionError) as e:
+        raise WebSocketException(code=1008, reason=str(e))
+
+async def relay_session_event(event: dict):
+    # الـ logout لازم يوصل لكل الـ workers عشان كل واحد عنده كاش لوحده
+    session_store.revoke(event["key"], event["expires_at"])
+
+event_bus.subscribe("sessions", relay_session_event)
+
+# ----------------- WebSocket Manager -----------------
 post_manager = ConnectionManager()
 
+async def publish_post_event(event: dict):
+    # كل تغيير في الفيد بيعدي من هنا، وبيوصل لكل الـ workers عن طريق الـ event bus
+    await event_bus.publish("posts", event)
+
+async def relay_post_event(event: dict):
+    # كل worker بيمسح البوست من الكاش بتاعه وبعدين يبعت للـ clients المتوصلين بيه
+    post_ids = event.get("post_ids") or ([event["post_id"]] if "post_id" in event else [])
+    for post_id in post_ids:
+        feed_cache.invalidate(post_id)
+    feed_snapshot.bump()
+    await post_manager.broadcast(event)
+
+def reset_feed_caches():
+    # بعد انقطاع الـ LISTEN ممكن نكون فوّتنا أحداث من workers تانية
+    feed_cache.clear()
+    feed_snapshot.bump()
+
+event_bus.subscribe("posts", relay_post_event)
+event_bus.on_reconnect(reset_feed_caches)
+
+@app.on_event("startup")
+async def start_event_bus() -> None:
+    await event_bus.start()
+    await notification_queue.start(write_notifications)
+
+@app.on_event("shutdown")
+async def stop_event_bus() -> None:
+    # آخر batch من الإشعارات لازم تتبعت قبل ما الـ bus يقفل
+    await notification_queue.stop()
+    await event_bus.stop()
+
 @app.websocket("/ws/posts")
 async def post_websocket(websocket: WebSocket):
     await post_manager.connect(websocket)
@@ -40,15 +152,100 @@ async def post_websocket(websocket: WebSocket):
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
+        pass
+    finally:
         post_manager.disconnect(websocket)
 
-# ----------------- Database Dependency -----------------
-def get_db():
-    db = SessionLocal()
+# ----------------- Chat WebSocket -----------------
+chat_manager = UserConnectionManager()
+presence = PresenceStore()
+
+async def publish_chat_event(event: dict):
+    await event_bus.publish("chat", event)
+
+async def relay_chat_event(event: dict):
+    # كل worker بيحدّث الـ presence عنده ويبعت للمستخدمين المتوصلين بيه بس
+    kind = event.get("type")
+    if kind == "message":
+        sender, receiver = event["sender"], event["receiver"]
+        presence.set_typing(sender, False)
+        recipients = [user for user in {sender, receiver} if chat_manager.is_connected(user)]
+        if not recipients:
+            return
+        # الحدث فيه الـ id بس (الـ content ممكن يعدي حد الـ 8000 byte بتاع NOTIFY)،
+        # والـ worker اللي عنده حد من الطرفين متوصل هو اللي بيقرا الرسالة
+        async with AsyncSessionLocal() as db:
+            message = await crud.get_message(db, event["id"])
+        if message is None:
+            return
+        payload = {"type": "message", "message": crud.serialize_message(message)}
+        for user in recipients:
+            await chat_manager.send_to(user, payload)
+    elif kind == "typing":
+        presence.set_typing(event["user"], event["typing"], event.get("to"))
+        if event.get("to"):
+            await chat_manager.send_to(event["to"], event)
+    elif kind == "presence":
+        presence.touch(event["user"])
+
+event_bus.subscribe("chat", relay_chat_event)
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket, user: str | None = Query(None), token: str | None = Query(None)):
+    user = await websocket_identity(token, user, "username")
+    await chat_manager.connect(user, websocket)
+    await publish_chat_event({"type": "presence", "user": user})
     try:
-        yield db
+        while True:
+            try:
+                data = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            if isinstance(data, dict) and data.get("type") == "typing":
+                await publish_chat_event({
+                    "type": "typing",
+                    "user": user,
+                    "to": data.get("to"),
+                    "typing": bool(data.get("typing"))
+                })
+            else:
+                await publish_chat_event({"type": "presence", "user": user})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        chat_manager.disconnect(user, websocket)
+
+@app.on_event("startup")
+@repeat_every(seconds=60)
+async def prune_presence_task() -> None:
+    presence.prune()
+
+# ----------------- Notifications WebSocket -----------------
+notification_manager = UserConnectionManager()
+
+async def write_notifications(events: list):
+    async with AsyncSessionLocal() as db:
+        notifications = await crud.create_notifications(db, events)
+    # كل إشعار لوحده عشان الـ payload في NOTIFY محدود
+    for notification in notifications:
+        await event_bus.publish("notifications", crud.serialize_notification(notification))
+
+async def relay_notification(notification: dict):
+    await notification_manager.send_to(notification["user_id"], {"type": "notification", "notification": notification})
+
+event_bus.subscribe("notifications", relay_notification)
+
+@app.websocket("/ws/notifications/{user_id}")
+async def notification_websocket(websocket: WebSocket, user_id: int, token: str | None = Query(None)):
+    await websocket_identity(token, user_id, "user_id")
+    await notification_manager.connect(user_id, websocket)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
     finally:
-        db.close()
+        notification_manager.disconnect(user_id, websocket)
 
 # ----------------- Schemas -----------------
 class UserRegister(BaseModel):
@@ -63,37 +260,57 @@ class UserCreate(BaseModel):
     username: str
 
 class MessageCreate(BaseModel):
-    sender: str
+    sender: str | None = None
     receiver: str
     content: str
     timestamp: str | None = None
 
 class TypingStatus(BaseModel):
-    user: str
+    user: str | None = None
     typing: bool
+    to: str | None = None
 
 class PostCreate(BaseModel):
-    user_id: int
+    user_id: int | None = None
     content: str
 
 class CommentCreate(BaseModel):
-    user_id: int
+    user_id: int | None = None
     post_id: int
     content: str
 
 class LikeCreate(BaseModel):
-    user_id: int
+    user_id: int | None = None
     post_id: int
 
+class LikeAction(BaseModel):
+    post_id: int
+    liked: bool
+
+class LikeBatch(BaseModel):
+    user_id: int | None = None
+    actions: List[LikeAction]
+
 class PostUpdate(BaseModel):
     content: str
 
+class FastJSONResponse(JSONResponse):
+    # للـ endpoints اللي بترجع dto rows: orjson بيحولها على طول من غير pydantic
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
 class UserOut(BaseModel):
     id: int
     username: str
     class Config:
         orm_mode = True
 
+class LoginOut(BaseModel):
+    id: int
+    username: str
+    token: str
+    expires_at: int
+
 class MessageOut(BaseModel):
     id: int
     sender: str
@@ -103,6 +320,12 @@ class MessageOut(BaseModel):
     class Config:
         orm_mode = True
 
+class MessagePage(BaseModel):
+    messages: List[MessageOut]
+    # next_cursor للصفحات الأقدم (before)، و latest_cursor للرسايل الجديدة (since)
+    next_cursor: str | None = None
+    latest_cursor: str | None = None
+
 class PostOut(BaseModel):
     id: int
     user_id: int
@@ -129,136 +352,396 @@ class NotificationOut(BaseModel):
     class Config:
         orm_mode = True
 
+class NotificationPage(BaseModel):
+    notifications: List[NotificationOut]
+    # next_cursor للصفحات الأقدم (before)، و read_cursor لـ up_to في mark-read
+    next_cursor: str | None = None
+    read_cursor: str | None = None
+
 # ----------------- Auth & Users -----------------
 @app.post("/register", response_model=UserOut)
-def register(user: UserRegister, db: Session = Depends(get_db)):
-    if crud.get_user_by_username(db, user.username):
+async def register(user: UserRegister, db: AsyncSession = Depends(get_db)):
+    if await crud.get_user_by_username(db, user.username):
         raise HTTPException(status_code=400, detail="Username already exists")
-    return crud.create_user(db, user.username, user.password)
-
-@app.post("/login", response_model=UserOut)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    authenticated_user = crud.verify_user(db, user.username, user.password)
-    if not authenticated_user:
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-    return authenticated_user
+    try:
+        hashed_password = await passwords.hash_password(user.password)
+    except passwords.PasswordPoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return await crud.create_user(db, user.username, hashed_password)
+
+@app.post("/login", response_model=LoginOut)
+async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
+    db_user = await crud.get_user_by_username(db, user.username)
+    try:
+        if not db_user or not await passwords.verify_password(user.password, db_user.password):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        # لو BCRYPT_ROUNDS اتغير بنعيد الهاش بالتكلفة الجديدة وإحنا معانا الباسورد
+        if passwords.needs_rehash(db_user.password):
+            await crud.update_user_password(db, db_user, await passwords.hash_password(user.password))
+    except passwords.PasswordPoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    token, expires_at = session_store.issue(db_user.id, db_user.username)
+    return {"id": db_user.id, "username": db_user.username, "token": token, "expires_at": expires_at}
+
+@app.post("/logout")
+async def logout(authorization: str | None = Header(None), db: AsyncSession = Depends(get_db)):
+    token = bearer_token(authorization)
+    if not token:
+        raise unauthorized("Not authenticated")
+    try:
+        session = await read_session(token, db)
+    except InvalidSession as e:
+        raise unauthorized(str(e))
+    event = {"key": token_key(token), "expires_at": session.expires_at}
+    # الجدول للـ workers اللي هتقوم بعدين، والـ event للكاش بتاع اللي شغالين دلوقتي
+    await crud.revoke_session(db, event["key"], event["expires_at"])
+    # نلغيه هنا على طول، ومن غير ما نستنى الـ NOTIFY يرجع لنفس الـ worker
+    session_store.revoke(event["key"], event["expires_at"])
+    await event_bus.publish("sessions", event)
+    return {"message": "Logged out"}
 
 @app.get("/users", response_model=List[UserOut])
-def list_users(db: Session = Depends(get_db)):
-    return crud.get_all_users(db)
+async def list_users(db: AsyncSession = Depends(get_db)):
+    return FastJSONResponse(await crud.get_all_users(db))
 
 # ----------------- Messages -----------------
 @app.post("/messages", response_model=MessageOut)
-def send_message(msg: MessageCreate, db: Session = Depends(get_db)):
-    return crud.create_message(db, msg.sender, msg.receiver, msg.content, msg.timestamp)
-
-@app.get("/messages", response_model=List[MessageOut])
-def list_messages(db: Session = Depends(get_db)):
-    return crud.get_all_messages(db)
+async def send_message(msg: MessageCreate, session: Session | None = Depends(get_session), db: AsyncSession = Depends(get_db)):
+    sender = acting_username(session, msg.sender)
+    message = await crud.create_message(db, sender, msg.receiver, msg.content, msg.timestamp)
+    await publish_chat_event({"type": "message", "id": message.id, "sender": message.sender, "receiver": message.receiver})
+    return message
+
+@app.get("/messages", response_model=MessagePage)
+async def list_messages(
+    peer: str = Query(...),
+    user: str | None = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    before: str | None = Query(None),
+    since: str | None = Query(None),
+    session: Session | None = Depends(get_session),
+    db: AsyncSession = Depends(get_db)
+):
+    user = acting_username(session, user)
+    if before and since:
+        raise HTTPException(status_code=400, detail="Use either before or since, not both")
+    try:
+        if since:
+            return FastJSONResponse(await crud.get_conversation_since(db, user, peer, since, limit))
+        return FastJSONResponse(await crud.get_conversation(db, user, peer, limit, before))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/typing")
-def update_typing_status(data: TypingStatus):
+async def update_typing_status(data: TypingStatus, session: Session | None = Depends(get_session)):
+    user = acting_username(session, data.user)
+    await publish_chat_event({"type": "typing", "user": user, "to": data.to, "typing": data.typing})
     return {"message": "updated"}
 
 @app.get("/typing")
-def get_typing_status(user: str):
-    return {"typing": False}
+async def get_typing_status(user: str, to: str | None = None):
+    return {"typing": presence.is_typing(user, to)}
+
+@app.get("/presence/{user}")
+async def get_presence(user: str):
+    last_seen = presence.last_seen(user)
+    return {
+        "online": presence.is_online(user),
+        "last_seen": datetime.utcfromtimestamp(last_seen).isoformat() if last_seen else None
+    }
 
 # ----------------- Posts -----------------
 @app.post("/posts", response_model=PostOut)
-async def create_post(post: PostCreate, db: Session = Depends(get_db)):
+async def create_post(post: PostCreate, session: Session | None = Depends(get_session), db: AsyncSession = Depends(get_db)):
+    user_id = acting_user(session, post.user_id)
     try:
-        created = crud.create_post(db, post.user_id, post.content)
-        await post_manager.broadcast({"action": "new_post", "post_id": created.id})
+        created = await crud.create_post(db, user_id, post.content)
+        await publish_post_event({"action": "new_post", "post_id": created.id})
         return created
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get("/posts/quota")
+async def get_post_quota(
+    user_id: int | None = Query(None),
+    session: Session | None = Depends(get_session),
+    db: AsyncSession = Depends(get_db)
+):
+    return await crud.get_post_quota(db, acting_user(session, user_id))
+
 @app.get("/posts")
-def get_posts(current_user_id: int = Query(...), db: Session = Depends(get_db)):
-    return crud.get_posts_with_details(db, current_user_id)
+async def get_posts(
+    request: Request,
+    current_user_id: int | None = Query(None),
+    limit: int | None = Query(None, ge=1, le=100),
+    cursor: str | None = Query(None),
+    session: Session | None = Depends(get_session),
+    db: AsyncSession = Depends(get_db)
+):
+    current_user_id = acting_user(session, current_user_id)
+    # الرد المتخزن (والـ 304 منه) مبيلمسش الداتابيز خالص (الـ session مبتاخدش connection إلا مع أول query)
+    version = feed_snapshot.version
+    key = (current_user_id, limit, cursor)
+    cached = feed_snapshot.get(key, version)
+    if cached is None:
+        try:
+            body = await crud.get_feed_json(db, current_user_id, limit, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        etag = feed_snapshot.put(key, version, body)
+    else:
+        body, etag = cached
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if feed_snapshot.matches(request.headers.get("if-none-match"), etag):
+        feed_snapshot.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.put("/posts/{post_id}")
-async def edit_post(post_id: int, data: PostUpdate, user_id: int = Query(...), db: Session = Depends(get_db)):
+async def edit_post(
+    post_id: int,
+    data: PostUpdate,
+    user_id: int | None = Query(None),
+    session: Session | None = Depends(get_session),
+    db: AsyncSession = Depends(get_db)
+):
+    user_id = acting_user(session, user_id)
     try:
-        updated = crud.update_post(db, post_id, user_id, data.content)
-        await post_manager.broadcast({"action": "edit_post", "post_id": updated.id})
+        updated = await crud.update_post(db, post_id, user_id, data.content)
+        await publish_post_event({"action": "edit_post", "post_id": updated.id})
         return updated
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/posts/{post_id}")
-async def remove_post(post_id: int, user_id: int = Query(...), db: Session = Depends(get_db)):
+async def remove_post(
+    post_id: int,
+    user_id: int | None = Query(None),
+    session: Session | None = Depends(get_session),
+    db: AsyncSession = Depends(get_db)
+):
+    user_id = acting_user(session, user_id)
     try:
-        crud.delete_post(db, post_id, user_id)
-        await post_manager.broadcast({"action": "delete_post", "post_id": post_id})
+        await crud.delete_post(db, post_id, user_id)
+        await publish_post_event({"action": "delete_post", "post_id": post_id})
         return {"message": "Post deleted"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+
 # ----------------- Comments -----------------
 @app.post("/comments", response_model=CommentOut)
-async def comment_on_post(data: CommentCreate, db: Session = Depends(get_db)):
-    comment = crud.add_comment(db, data.user_id, data.post_id, data.content)
-    await post_manager.broadcast({"action": "new_comment", "post_id": data.post_id})
+async def comment_on_post(data: CommentCreate, session: Session | None = Depends(get_session), db: AsyncSession = Depends(get_db)):
+    user_id = acting_user(session, data.user_id)
+    try:
+        comment = await crud.add_comment(db, user_id, data.post_id, data.content)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await publish_post_event({"action": "new_comment", "post_id": data.post_id})
     return comment
 
 @app.get("/comments/{post_id}", response_model=List[CommentOut])
-def get_comments(post_id: int, db: Session = Depends(get_db)):
-    return crud.get_comments_for_post(db, post_id)
+async def get_comments(post_id: int, db: AsyncSession = Depends(get_db)):
+    return FastJSONResponse(await crud.get_comments_for_post(db, post_id))
 
 @app.put("/comments/{comment_id}")
-async def update_comment(comment_id: int, new_content: str = Query(...), user_id: int = Query(...), db: Session = Depends(get_db)):
+async def update_comment(
+    comment_id: int,
+    new_content: str = Query(...),
+    user_id: int | None = Query(None),
+    session: Session | None = Depends(get_session),
+    db: AsyncSession = Depends(get_db)
+):
+    user_id = acting_user(session, user_id)
     try:
-        comment = crud.edit_comment(db, comment_id, user_id, new_content)
-        await post_manager.broadcast({"action": "edit_comment", "post_id": comment.post_id})
+        comment = await crud.edit_comment(db, comment_id, user_id, new_content)
+        await publish_post_event({"action": "edit_comment", "post_id": comment.post_id})
         return comment
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.delete("/comments/{comment_id}")
-async def delete_comment(comment_id: int, user_id: int = Query(...), db: Session = Depends(get_db)):
+async def delete_comment(
+    comment_id: int,
+    user_id: int | None = Query(None),
+    session: Session | None = Depends(get_session),
+    db: AsyncSession = Depends(get_db)
+):
+    user_id = acting_user(session, user_id)
     try:
-        result = crud.delete_comment(db, comment_id, user_id)
-        await post_manager.broadcast({"action": "delete_comment", "comment_id": comment_id})
+        result = await crud.delete_comment(db, comment_id, user_id)
+        await publish_post_event({"action": "delete_comment", "comment_id": comment_id, "post_id": result["post_id"]})
         return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # ----------------- Likes -----------------
 @app.post("/likes")
-async def like_post(data: LikeCreate, db: Session = Depends(get_db)):
-    like = crud.like_post(db, data.user_id, data.post_id)
-    await post_manager.broadcast({"action": "like", "post_id": data.post_id})
-    return like
+async def like_post(data: LikeCreate, session: Session | None = Depends(get_session), db: AsyncSession = Depends(get_db)):
+    user_id = acting_user(session, data.user_id)
+    try:
+        result = await crud.like_post(db, user_id, data.post_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result["changed"]:
+        await publish_post_event({"action": "like", "post_id": data.post_id})
+    return result
+
+@app.post("/likes/batch")
+async def apply_like_batch(data: LikeBatch, session: Session | None = Depends(get_session), db: AsyncSession = Depends(get_db)):
+    user_id = acting_user(session, data.user_id)
+    try:
+        result = await crud.apply_like_batch(db, user_id, [(a.post_id, a.liked) for a in data.actions])
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    changed = [r["post_id"] for r in result["results"] if r["changed"]]
+    if changed:
+        await publish_post_event({"action": "like_batch", "post_ids": changed})
+    return result
 
 @app.get("/likes/{post_id}")
-def count_likes(post_id: int, db: Session = Depends(get_db)):
-    return {"likes": crud.count_likes_for_post(db, post_id)}
+async def count_likes(post_id: int, db: AsyncSession = Depends(get_db)):
+    return {"likes": await crud.count_likes_for_post(db, post_id)}
 
 @app.delete("/likes")
-async def unlike_post(user_id: int = Query(...), post_id: int = Query(...), db: Session = Depends(get_db)):
+async def unlike_post(
+    post_id: int = Query(...),
+    user_id: int | None = Query(None),
+    session: Session | None = Depends(get_session),
+    db: AsyncSession = Depends(get_db)
+):
+    user_id = acting_user(session, user_id)
     try:
-        crud.remove_like(db, user_id, post_id)
-        await post_manager.broadcast({"action": "unlike", "post_id": post_id})
-        return {"message": "Like removed"}
+        result = await crud.remove_like(db, user_id, post_id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if result["changed"]:
+        await publish_post_event({"action": "unlike", "post_id": post_id})
+    return result
 
 # ----------------- Notifications -----------------
-@app.get("/notifications/{user_id}", response_model=List[NotificationOut])
-def get_notifications(user_id: int, db: Session = Depends(get_db)):
-    return crud.get_notifications(db, user_id)
+@app.get("/notifications/{user_id}", response_model=NotificationPage)
+async def get_notifications(
+    user_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    before: str | None = Query(None),
+    session: Session | None = Depends(get_session),
+    db: AsyncSession = Depends(get_db)
+):
+    acting_user(session, user_id)
+    try:
+        return await crud.get_notifications(db, user_id, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/notifications/{user_id}/unread-count")
+async def get_unread_count(user_id: int, session: Session | None = Depends(get_session), db: AsyncSession = Depends(get_db)):
+    acting_user(session, user_id)
+    return {"unread_count": await crud.count_unread_notifications(db, user_id)}
 
 @app.post("/notifications/mark-read/{user_id}")
-def mark_notifications(user_id: int, db: Session = Depends(get_db)):
-    crud.mark_notifications_read(db, user_id)
-    return {"message": "Notifications marked as read."}
+async def mark_notifications(
+    user_id: int,
+    up_to: str | None = Query(None),
+    session: Session | None = Depends(get_session),
+    db: AsyncSession = Depends(get_db)
+):
+    acting_user(session, user_id)
+    try:
+        marked = await crud.mark_notifications_read(db, user_id, up_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Notifications marked as read.", "marked": marked}
+
+# ----------------- Health -----------------
+@app.get("/health/live")
+def liveness():
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness():
+    try:
+        await check_ready(Base.metadata.tables)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "detail": str(e) or type(e).__name__})
+    return {"status": "ready"}
+
+# ----------------- Metrics -----------------
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/feed-cache")
+def feed_cache_metrics():
+    return {**feed_cache.stats(), "snapshot": feed_snapshot.stats()}
+
+@app.get("/metrics/websockets")
+def websocket_metrics():
+    return {
+        **post_manager.stats(),
+        "chat": chat_manager.stats(),
+        "notifications": notification_manager.stats(),
+        "presence": presence.stats()
+    }
+
+@app.get("/metrics/notifications")
+def notification_metrics():
+    return notification_queue.stats()
+
+@app.get("/metrics/cleanup")
+def cleanup_metrics():
+    return post_cleanup.stats()
+
+@app.get("/metrics/sessions")
+def session_metrics():
+    return session_store.stats()
+
+@app.get("/metrics/db-pool")
+def db_pool_metrics():
+    return pool_status()
+
+metrics.register_collector("db_pool", pool_status)
+metrics.register_collector("feed_cache", feed_cache_metrics)
+metrics.register_collector("websockets", websocket_metrics)
+metrics.register_collector("notification_queue", notification_queue.stats)
+metrics.register_collector("post_cleanup", post_cleanup.stats)
+metrics.register_collector("sessions", session_store.stats)
 
 # ----------------- Auto Delete Old Posts -----------------
+async def publish_cleanup_batch(post_ids: list):
+    await publish_post_event({"action": "cleanup", "post_ids": post_ids})
+
+@app.on_event("startup")
+@repeat_every(seconds=POST_CLEANUP_INTERVAL_SECONDS)
+async def post_cleanup_task() -> None:
+    async with AsyncSessionLocal() as db:
+        await post_cleanup.run(db, on_batch=publish_cleanup_batch)
+
+@app.on_event("shutdown")
+def shutdown_password_pool() -> None:
+    passwords.shutdown()
+
+# ----------------- Reconcile Post Counters & Quota -----------------
+@app.on_event("startup")
+@repeat_every(seconds=60 * 60)
+async def reconcile_counters_task() -> None:
+    async with AsyncSessionLocal() as db:
+        if await crud.reconcile_post_counters(db):
+            # العدادات اتصلحت، فالردود الجاهزة في كل الـ workers لازم تتبني تاني
+            await publish_post_event({"action": "refresh"})
+        await crud.reconcile_post_quota(db)
+
+# ----------------- Notification Retention -----------------
+@app.on_event("startup")
+@repeat_every(seconds=60 * 60)
+async def prune_notifications_task() -> None:
+    async with AsyncSessionLocal() as db:
+        await crud.prune_read_notifications(db)
+
+# ----------------- Revoked Sessions Retention -----------------
 @app.on_event("startup")
-@repeat_every(seconds=60 * 60 * 24)
-def daily_post_cleanup_task() -> None:
-    db = SessionLocal()
-    crud.delete_old_posts(db)
-    db.close()
\ No newline at end of file
+@repeat_every(seconds=60 * 60)
+async def prune_revoked_sessions_task() -> None:
+    async with AsyncSessionLocal() as db:
+        await crud.prune_revoked_sessions(db)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, UniqueConstraint
+from sqlalchemy import inspect, text, Column, String, Integer, Date, DateTime, Text, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -17,17 +17,28 @@ class Message(Base):
     content = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_messages_conversation", "sender", "receiver", "timestamp", "id"),
+    )
+
 class Post(Base):
     __tablename__ = "posts"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     content = Column(Text, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    likes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comments_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     user = relationship("User")
     comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan", passive_deletes=True)
     likes = relationship("Like", back_populates="post", cascade="all, delete-orphan", passive_deletes=True)
 
+    __table_args__ = (
+        Index("ix_posts_user_id_timestamp", "user_id", "timestamp"),
+        Index("ix_posts_timestamp", "timestamp"),
+    )
+
 class Comment(Base):
     __tablename__ = "comments"
     id = Column(Integer, primary_key=True, index=True)
@@ -39,6 +50,10 @@ class Comment(Base):
     post = relationship("Post", back_populates="comments")
     user = relationship("User")
 
+    __table_args__ = (
+        Index("ix_comments_post_id_timestamp", "post_id", "timestamp"),
+    )
+
 class Like(Base):
     __tablename__ = "likes"
     id = Column(Integer, primary_key=True, index=True)
@@ -49,7 +64,9 @@ class Like(Base):
     user = relationship("User")
 
     __table_args__ = (
+        # unique_like بيغطي البحث بـ post_id، والـ index التاني لـ "لايكاتي"
         UniqueConstraint("post_id", "user_id", name="unique_like"),
+        Index("ix_likes_user_id_post_id", "user_id", "post_id"),
     )
 
 class Notification(Base):
@@ -59,3 +76,54 @@ class Notification(Base):
     message = Column(Text, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
     is_read = Column(Integer, default=0)
+    # إشعارات اللايك والكومنت: البوست والنوع وعدد اللي عملوا الحدث، عشان الجديد يندمج في اللي لسه متقريش
+    post_id = Column(Integer)
+    kind = Column(String)
+    actor_count = Column(Integer)
+    last_actor_id = Column(Integer)
+
+    __table_args__ = (
+        # الأول لعدد اللي متقريش، التاني للصفحات، والتالت لحذف القديم، والرابع للدمج
+        Index("ix_notifications_user_id_is_read_timestamp", "user_id", "is_read", "timestamp"),
+        Index("ix_notifications_user_id_id", "user_id", "id"),
+        Index("ix_notifications_timestamp", "timestamp"),
+        Index("ix_notifications_post_id_kind", "post_id", "kind"),
+    )
+
+class DailyPostQuota(Base):
+    # عداد البوستات على مستوى السيرفر لكل يوم
+    __tablename__ = "daily_post_quota"
+    day = Column(Date, primary_key=True)
+    used = Column(Integer, nullable=False, default=0, server_default="0")
+
+class DailyPostClaim(Base):
+    # صف لكل مستخدم نزل بوست في اليوم، والـ primary key بيمنع التكرار
+    __tablename__ = "daily_post_claims"
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+
+class RevokedSession(Base):
+    # التوكنات اللي اتعملها logout (hash التوكن مش التوكن نفسه)، لحد ما تنتهي لوحدها
+    __tablename__ = "revoked_sessions"
+    token_key = Column(String(64), primary_key=True)
+    expires_at = Column(Integer, nullable=False, index=True)
+
+def upgrade_schema(bind):
+    # create_all مبيعدلش جداول موجودة، فبنضيف الأعمدة والـ indexes الجديدة يدويًا
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
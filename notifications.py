@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import os
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# الإشعارات بتتجمع في الذاكرة وتتكتب كل فترة في batch واحدة
+NOTIFICATION_FLUSH_SECONDS = float(os.getenv("NOTIFICATION_FLUSH_SECONDS", "5"))
+NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", "500"))
+NOTIFICATION_MAX_PENDING = int(os.getenv("NOTIFICATION_MAX_PENDING", "10000"))
+
+class NotificationQueue:
+    """طابور إشعارات لكل worker: الـ request بيضيف حدث ويرجع على طول.
+
+    الـ handler بيستلم list من (kind, actor_id, post_id) وهو المسؤول عن
+    التجميع والكتابة والإرسال. اللي في الطابور بيضيع لو الـ process وقع.
+    """
+
+    def __init__(self, flush_interval: float = NOTIFICATION_FLUSH_SECONDS,
+                 batch_size: int = NOTIFICATION_BATCH_SIZE, max_pending: int = NOTIFICATION_MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._handler = None
+        self._wakeup = None
+        self._task = None
+        self.enqueued = 0
+        self.dropped = 0
+        self.batches = 0
+        self.failed = 0
+
+    def enqueue(self, kind: str, actor_id: int, post_id: int):
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append((kind, actor_id, post_id))
+        self.enqueued += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self, handler):
+        self._handler = handler
+        self._wakeup = asyncio.Event()
+        if self._pending:
+            self._wakeup.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        self._wakeup = None
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # نستنى شوية عشان الأحداث اللي جاية ورا بعض تتجمع في إشعار واحد
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._pending and self._handler is not None:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            self.batches += 1
+            try:
+                await self._handler(batch)
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("failed to write %d notification events", len(batch))
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "failed": self.failed,
+        }
+
+notification_queue = NotificationQueue()
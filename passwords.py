@@ -0,0 +1,51 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+# bcrypt بياخد ~250ms CPU للعملية، فبنشغله على pool منفصل بدل ما يوقف الـ workers
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "16"))
+
+class PasswordPoolBusy(Exception):
+    pass
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+
+async def _run_in_pool(fn, *args):
+    global _pending
+    # العداد بيتعدل من الـ event loop بس، فمش محتاج lock
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        raise PasswordPoolBusy("Server is busy, try again shortly")
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _pending -= 1
+
+def _hash(password: str):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+def _check(password: str, hashed: str):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+async def hash_password(password: str):
+    return await _run_in_pool(_hash, password)
+
+async def verify_password(password: str, hashed: str):
+    return await _run_in_pool(_check, password, hashed)
+
+def needs_rehash(hashed: str):
+    # شكل الهاش: $2b$<rounds>$<salt+hash>
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def pending():
+    return _pending
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
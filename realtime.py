@@ -0,0 +1,172 @@
+import asyncio
+import json
+import os
+import time
+from typing import Dict
+from fastapi import WebSocket
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+
+# كود 1013 = "Try Again Later"، بنقفل بيه الـ clients البطيئة
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+class _Subscriber:
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.writer = None
+
+# ----------------- WebSocket Manager -----------------
+class ConnectionManager:
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE, send_timeout: float = WS_SEND_TIMEOUT):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.active_connections: Dict[WebSocket, _Subscriber] = {}
+        self.dropped_connections = 0
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        subscriber = _Subscriber(websocket, self.queue_size)
+        subscriber.writer = asyncio.create_task(self._write_loop(subscriber))
+        self.active_connections[websocket] = subscriber
+
+    def disconnect(self, websocket: WebSocket):
+        subscriber = self.active_connections.pop(websocket, None)
+        if subscriber and subscriber.writer is not asyncio.current_task():
+            subscriber.writer.cancel()
+
+    async def _write_loop(self, subscriber: _Subscriber):
+        # كل connection ليها writer خاص بيها، فالـ client البطيء مبيأخرش الباقيين
+        try:
+            while True:
+                text = await subscriber.queue.get()
+                async with asyncio.timeout(self.send_timeout):
+                    await subscriber.websocket.send_text(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._drop(subscriber.websocket)
+
+    def _drop(self, websocket: WebSocket, code: int = 1011):
+        if websocket not in self.active_connections:
+            return
+        self.disconnect(websocket)
+        self.dropped_connections += 1
+        asyncio.create_task(self._close(websocket, code))
+
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def send_text(self, text: str):
+        for websocket, subscriber in list(self.active_connections.items()):
+            try:
+                subscriber.queue.put_nowait(text)
+            except asyncio.QueueFull:
+                self._drop(websocket, SLOW_CONSUMER_CLOSE_CODE)
+
+    async def broadcast(self, message: dict):
+        # بنحول الرسالة لـ JSON مرة واحدة لكل الـ connections
+        self.send_text(json.dumps(message, ensure_ascii=False, separators=(",", ":")))
+
+    def stats(self):
+        return {
+            "connections": len(self.active_connections),
+            "queued_messages": sum(s.queue.qsize() for s in self.active_connections.values()),
+            "dropped_connections": self.dropped_connections,
+        }
+
+# ----------------- Per-user routing -----------------
+class UserConnectionManager:
+    """connections متقسمة حسب المستخدم، عشان نبعت لشخص معين بس."""
+
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE, send_timeout: float = WS_SEND_TIMEOUT):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.users: Dict[str, ConnectionManager] = {}
+
+    async def connect(self, user: str, websocket: WebSocket):
+        manager = self.users.get(user)
+        if manager is None:
+            manager = self.users[user] = ConnectionManager(self.queue_size, self.send_timeout)
+        await manager.connect(websocket)
+
+    def disconnect(self, user: str, websocket: WebSocket):
+        manager = self.users.get(user)
+        if manager is None:
+            return
+        manager.disconnect(websocket)
+        if not manager.active_connections:
+            del self.users[user]
+
+    def is_connected(self, user: str):
+        return user in self.users
+
+    async def send_to(self, user: str, message: dict):
+        manager = self.users.get(user)
+        if manager is not None:
+            await manager.broadcast(message)
+
+    def stats(self):
+        return {
+            "users": len(self.users),
+            "connections": sum(len(m.active_connections) for m in self.users.values()),
+            "dropped_connections": sum(m.dropped_connections for m in self.users.values()),
+        }
+
+# ----------------- Presence & typing -----------------
+PRESENCE_TTL_SECONDS = float(os.getenv("PRESENCE_TTL_SECONDS", "60"))
+TYPING_TTL_SECONDS = float(os.getenv("TYPING_TTL_SECONDS", "6"))
+# آخر ظهور بيفضل محفوظ يوم بعد ما المستخدم يبقى offline
+PRESENCE_RETENTION_SECONDS = float(os.getenv("PRESENCE_RETENTION_SECONDS", "86400"))
+
+class PresenceStore:
+    """آخر ظهور وحالة الكتابة في الذاكرة، وكل حاجة بتنتهي لوحدها بعد الـ TTL."""
+
+    def __init__(self, presence_ttl: float = PRESENCE_TTL_SECONDS, typing_ttl: float = TYPING_TTL_SECONDS,
+                 retention: float = PRESENCE_RETENTION_SECONDS):
+        self.presence_ttl = presence_ttl
+        self.typing_ttl = typing_ttl
+        self.retention = retention
+        self._last_seen: Dict[str, float] = {}
+        self._typing: Dict[str, tuple] = {}
+
+    def touch(self, user: str):
+        self._last_seen[user] = time.time()
+
+    def is_online(self, user: str):
+        last_seen = self._last_seen.get(user)
+        return last_seen is not None and time.time() - last_seen < self.presence_ttl
+
+    def last_seen(self, user: str):
+        return self._last_seen.get(user)
+
+    def set_typing(self, user: str, typing: bool, to: str = None):
+        self.touch(user)
+        if typing:
+            self._typing[user] = (time.monotonic() + self.typing_ttl, to)
+        else:
+            self._typing.pop(user, None)
+
+    def is_typing(self, user: str, to: str = None):
+        state = self._typing.get(user)
+        if state is None:
+            return False
+        expires_at, target = state
+        if expires_at < time.monotonic():
+            self._typing.pop(user, None)
+            return False
+        return to is None or target is None or target == to
+
+    def prune(self):
+        now, wall = time.monotonic(), time.time()
+        for user in [u for u, (expires_at, _) in self._typing.items() if expires_at < now]:
+            del self._typing[user]
+        for user in [u for u, seen in self._last_seen.items() if wall - seen >= self.retention]:
+            del self._last_seen[user]
+
+    def stats(self):
+        return {"tracked_users": len(self._last_seen), "typing_users": len(self._typing)}
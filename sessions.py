@@ -0,0 +1,133 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+
+# لازم يبقى نفس السر في كل الـ workers، وإلا التوكن اللي طلع من worker مش هيشتغل في التاني
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(60 * 60 * 24)))
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+# لو true أي request من غير توكن بيترفض، غير كده الـ user_id اللي في الطلب لسه مقبول
+SESSION_REQUIRED = os.getenv("SESSION_REQUIRED", "false").lower() in ("1", "true", "yes")
+
+class InvalidSession(Exception):
+    pass
+
+@dataclass(slots=True, frozen=True)
+class Session:
+    user_id: int
+    username: str
+    expires_at: int
+
+def _b64encode(raw: bytes):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def _b64decode(value: str):
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+def token_key(token: str):
+    # الكاش وقائمة الإلغاء بيستخدموا hash التوكن، فالتوكن نفسه مبيتبعتش على الـ event bus
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+class SessionStore:
+    """توكن موقّع بـ HMAC فيه المستخدم والانتهاء، وكاش LRU للتوكنات اللي اتشافت.
+
+    التحقق مبيلمسش جدول users ولا bcrypt: أول مرة HMAC وسؤال واحد لجدول
+    revoked_sessions (عن طريق is_revoked)، وبعد كده lookup في الكاش.
+    """
+
+    def __init__(self, secret: bytes, ttl_seconds: int, max_entries: int):
+        self.secret = secret
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._revoked = {}
+        self._lock = Lock()
+        self.issued = 0
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def _sign(self, payload: str):
+        return _b64encode(hmac.new(self.secret, payload.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self, user_id: int, username: str):
+        expires_at = int(time.time()) + self.ttl_seconds
+        payload = _b64encode(json.dumps(
+            [user_id, username, expires_at, secrets.token_hex(4)], ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8"))
+        self.issued += 1
+        return f"{payload}.{self._sign(payload)}", expires_at
+
+    async def validate(self, token: str, is_revoked=None):
+        now = time.time()
+        key = token_key(token)
+        with self._lock:
+            session = self._cache.get(key)
+            if session is not None:
+                if session.expires_at > now:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return session
+                del self._cache[key]
+            self.misses += 1
+
+        session = self._decode(token)
+        if session.expires_at <= now:
+            self.rejected += 1
+            raise InvalidSession("Session expired")
+        # الـ logout متسجل في الداتابيز، فـ worker اتعمله restart أو قام بعد الـ logout برضه بيرفضه
+        revoked = key in self._revoked or (is_revoked is not None and await is_revoked(key))
+        with self._lock:
+            if revoked or key in self._revoked:
+                self._revoked[key] = session.expires_at
+                self.rejected += 1
+                raise InvalidSession("Session revoked")
+            self._cache[key] = session
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return session
+
+    def _decode(self, token: str):
+        try:
+            payload, signature = token.split(".")
+            if not hmac.compare_digest(signature, self._sign(payload)):
+                raise ValueError("bad signature")
+            user_id, username, expires_at, _ = json.loads(_b64decode(payload))
+            return Session(int(user_id), str(username), int(expires_at))
+        except (ValueError, TypeError, UnicodeError):
+            self.rejected += 1
+            raise InvalidSession("Invalid session token")
+
+    def revoke(self, key: str, expires_at: int):
+        # التوكن بيفضل في القائمة لحد ما ينتهي لوحده، وبعدها مالوش لازمة
+        now = time.time()
+        with self._lock:
+            self._cache.pop(key, None)
+            self._revoked[key] = expires_at
+            for revoked, revoked_until in list(self._revoked.items()):
+                if revoked_until <= now:
+                    del self._revoked[revoked]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cached": len(self._cache),
+                "revoked": len(self._revoked),
+                "issued": self.issued,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rejected": self.rejected,
+            }
+
+# سر عشوائي لكل process معناه إن التوكن يترفض عشوائيًا مع أكتر من worker، فالأحسن الـ worker ميقومش
+if not SESSION_SECRET:
+    raise RuntimeError("SESSION_SECRET is not set; every worker needs the same secret to validate session tokens")
+
+session_store = SessionStore(SESSION_SECRET.encode("utf-8"), SESSION_TTL_SECONDS, SESSION_CACHE_MAX_ENTRIES)